@@ -6,6 +6,9 @@ from . import config
 from . import excel_loader
 from . import engine
 from . import field_builder
+from . import model
+from . import runner
+from . import snapshot
 from . import sp_api
 from . import validators
 
@@ -15,6 +18,9 @@ __all__ = [
     "excel_loader",
     "engine",
     "field_builder",
+    "model",
+    "runner",
+    "snapshot",
     "sp_api",
     "validators",
 ]
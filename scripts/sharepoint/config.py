@@ -22,3 +22,37 @@ SYSTEM_FIELDS = {
     "ContentTypeId",
     "_UIVersionString",
 }
+
+# Concurrency — lists provisioned in parallel overall, and per SharePoint site
+MAX_WORKERS = 6
+MAX_PER_SITE = 2
+
+# Max operations per SharePoint REST $batch request
+BATCH_LIMIT = 100
+
+# On-disk site snapshots (reused while SharePoint's ETag is unchanged; --snapshot-cache)
+SNAPSHOT_CACHE_DIR = r"C:\Users\mnc35\evboise-fleet\scripts\sharepoint\.cache"
+
+# Compiled copy of the schema registry, rebuilt only when the workbook changes
+REGISTRY_CACHE_PATH = r"C:\Users\mnc35\evboise-fleet\scripts\sharepoint\.cache\registry.pkl"
+
+# Field types (after normalization) the registry may use
+KNOWN_FIELD_TYPES = {
+    "Text",
+    "Note",
+    "Number",
+    "Currency",
+    "DateTime",
+    "Boolean",
+    "Choice",
+    "MultiChoice",
+    "User",
+    "UserMulti",
+    "Lookup",
+    "LookupMulti",
+    "URL",
+    "Counter",
+    "Calculated",
+    "Geolocation",
+    "Thumbnail",
+}
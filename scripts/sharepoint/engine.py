@@ -1,41 +1,210 @@
 # engine.py
 
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional
 from . import sp_api as sp
+from .config import SYSTEM_FIELDS
 from .field_builder import build_field_xml
+from .model import FieldSpec, ListSpec
 
 
-def _resolve_column(row, name: str) -> Any:
-    key = name.strip().lower()
-    normalized = {col.strip().lower(): col for col in row.index}
+# ----------------------------------------------------------
+# Batch op builders shared by create and reconcile
+# ----------------------------------------------------------
+def _create_ops(site_url: str, list_id: str, field: FieldSpec) -> List[Dict[str, Any]]:
+    internal = field.internal_name
+    ops = [sp.create_field_op(site_url, list_id, build_field_xml(field), label=internal)]
+    if field.hidden:
+        ops.append(sp.update_field_hidden_op(site_url, list_id, internal, hidden=True))
+    return ops
 
-    if key not in normalized:
-        raise KeyError(
-            f"Column '{name}' not found. Present columns: {list(row.index)}"
+
+def _view_names(fields: List[FieldSpec]) -> List[str]:
+    return [field.internal_name for field in fields if field.show_in_view]
+
+
+def _view_ops(view_uri: str, names: List[str]) -> List[Dict[str, Any]]:
+    # Reset view fields silently, then add visible fields back
+    return [sp.clear_view_fields_op(view_uri)] + [sp.add_view_field_op(view_uri, n) for n in names]
+
+
+def _run_ops(session, site_url: str, ops: List[Dict[str, Any]]) -> None:
+    results = sp.execute_batch(session, site_url, ops)
+
+    failed = [(op, res) for op, res in zip(ops, results) if not res["ok"]]
+    for op, res in failed:
+        print(f"❌ {res['label']}: {op['url'].rsplit('/', 1)[-1]} failed — {res['error']}")
+
+    if failed:
+        names = sorted({res["label"] for _, res in failed})
+        raise RuntimeError(
+            f"{len(failed)} of {len(ops)} field/view operations failed ({', '.join(names)})"
         )
 
-    return row[normalized[key]]
+
+# ----------------------------------------------------------
+# Reconcile — diff live fields against the registry
+# ----------------------------------------------------------
+def _remote_choices(field: Dict[str, Any]) -> List[str]:
+    choices = field.get("Choices") or []
+    if isinstance(choices, dict):
+        choices = choices.get("results", [])
+    return list(choices)
+
+
+def diff_fields(site_url: str, list_id: str, current: List[Dict[str, Any]], fields: List[FieldSpec]):
+    """
+    Compares live fields (sp.get_fields) with registry rows on InternalName,
+    Type, Required, Hidden and Choices. Returns (ops, counts, destructive):
+        missing field        → create (+ Hidden)
+        Required/Hidden/Choices changed → MERGE of just those properties
+    and, kept apart in `destructive` because they lose column data:
+        Type changed         → delete + create
+        not in registry      → delete, unless a system, base, read-only or
+                               undeletable field
+    Each destructive entry is {"What", "Ops", "Counts"}.
+    """
+    live = {f.get("InternalName"): f for f in current}
+    wanted = set()
+    ops: List[Dict[str, Any]] = []
+    counts = {"created": 0, "updated": 0, "deleted": 0}
+    destructive: List[Dict[str, Any]] = []
+
+    for field in fields:
+        internal = field.internal_name
+        wanted.add(internal)
+        remote = live.get(internal)
+        sp_type = field.type
+
+        if remote is None:
+            ops += _create_ops(site_url, list_id, field)
+            counts["created"] += 1
+            continue
+
+        if remote.get("TypeAsString", "").lower() != sp_type.lower():
+            destructive.append({
+                "What": f"retype {internal} ({remote.get('TypeAsString')} → {sp_type})",
+                "Ops": [sp.delete_field_op(site_url, list_id, remote["Id"], label=internal)]
+                       + _create_ops(site_url, list_id, field),
+                "Counts": {"deleted": 1, "created": 1},
+            })
+            continue
+
+        props: Dict[str, Any] = {}
+        if bool(remote.get("Required")) != field.required:
+            props["Required"] = field.required
+        if bool(remote.get("Hidden")) != field.hidden:
+            props["Hidden"] = field.hidden
+
+        entity = "SP.Field"
+        if sp_type == "Choice" and field.choices != _remote_choices(remote):
+            props["Choices"] = field.choices
+            entity = "SP.FieldChoice"
+
+        if props:
+            ops.append(sp.update_field_op(site_url, list_id, internal, props, sp_type=entity))
+            counts["updated"] += 1
+
+    for internal, remote in live.items():
+        if (
+            internal in wanted
+            or internal in SYSTEM_FIELDS
+            or internal.startswith("_")
+            or remote.get("FromBaseType")
+            or remote.get("ReadOnlyField")
+            or remote.get("Sealed")
+            or remote.get("CanBeDeleted") is False
+        ):
+            continue
+        destructive.append({
+            "What": f"delete {internal}",
+            "Ops": [sp.delete_field_op(site_url, list_id, remote["Id"], label=internal)],
+            "Counts": {"deleted": 1},
+        })
+
+    return ops, counts, destructive
+
+
+def reconcile_list(
+    session,
+    spec: ListSpec,
+    existing: Dict[str, Any],
+    confirm: Callable[[str], str] = input,
+) -> Dict[str, Any]:
+    """
+    `existing` from a site snapshot already carries Fields / ViewUri /
+    ViewFields, so no reads are made; from sp.get_list they are fetched.
+    Creates and updates are applied directly; column deletes and retypes
+    destroy data, so they only run after a typed YES via `confirm`.
+    """
+    site_url, list_name = spec.site_url, spec.name
+    list_id = existing["Id"]
+
+    if "Fields" in existing:
+        view_uri, current, view_current = existing["ViewUri"], existing["Fields"], existing["ViewFields"]
+    else:
+        view_uri = sp.get_default_view(session, site_url, list_id)["__metadata"]["uri"]
+        current = sp.get_fields(session, site_url, list_id)
+        view_current = sp.get_view_fields(session, view_uri)
+
+    ops, counts, destructive = diff_fields(site_url, list_id, current, spec.fields)
+
+    skipped = 0
+    if destructive:
+        choice = confirm(
+            f"⚠️  List '{list_name}': {'; '.join(d['What'] for d in destructive)} "
+            f"— data in these columns will be lost. Type YES to continue: "
+        ).strip()
+
+        if choice.lower() == "yes":
+            for d in destructive:
+                ops += d["Ops"]
+                for k, n in d["Counts"].items():
+                    counts[k] += n
+        else:
+            skipped = len(destructive)
+            print(f"⏭️  {list_name}: {skipped} destructive change(s) skipped — user declined.")
+
+    names = _view_names(spec.fields)
+    view_changed = view_current != names
+    if view_changed:
+        ops += _view_ops(view_uri, names)
+
+    if ops:
+        _run_ops(session, site_url, ops)
+
+    changes = ", ".join(f"{n} {k}" for k, n in counts.items() if n)
+    if view_changed:
+        changes = f"{changes}, view rebuilt" if changes else "view rebuilt"
+    if skipped:
+        changes = f"{changes}, {skipped} destructive skipped" if changes else f"{skipped} destructive skipped"
+    print(f"🔁 {list_name}: {changes or 'up to date'}")
+
+    return {
+        "Status": "OK",
+        "Message": f"Reconciled — {changes}." if changes else "Up to date — no changes.",
+        "ListUrl": f"{site_url}/Lists/{list_name}/AllItems.aspx",
+    }
 
 
 def process_list(
     session,
-    list_row,
-    fields_df,
+    spec: ListSpec,
     run_id: str,
     dry_run: bool,
+    confirm: Callable[[str], str] = input,
+    recreate: bool = False,
+    site_state: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
+    """
+    Existing lists are reconciled field by field (column deletes/retypes
+    only after `confirm`); with recreate=True they are deleted (after
+    confirmation) and rebuilt from scratch as before.
+    `site_state` is this site's snapshot (snapshot.load_site_snapshots);
+    without it the list is looked up with its own requests.
+    """
 
-    # Normalize site URL (remove trailing slash)
-    site_url = str(_resolve_column(list_row, "SiteUrl")).rstrip("/")
-
-    list_name = list_row["ListName"]
-    desc = list_row.get("Description", "") or ""
-
-    base_template_raw = list_row.get("BaseTemplate", 100)
-    try:
-        base_template = int(str(base_template_raw).strip())
-    except:
-        base_template = 100
+    site_url = spec.site_url
+    list_name = spec.name
 
     print("\n==============================")
     print(f"▶ Processing list: {list_name}")
@@ -45,10 +214,16 @@ def process_list(
     # ------------------------------------------------------
     # Check if list exists
     # ------------------------------------------------------
-    existing = sp.get_list(session, site_url, list_name)
+    if site_state is not None:
+        existing = site_state.get(str(list_name).lower())
+    else:
+        existing = sp.get_list(session, site_url, list_name)
+
+    if existing and not recreate:
+        return reconcile_list(session, spec, existing, confirm)
 
     if existing:
-        choice = input(
+        choice = confirm(
             f"⚠️  List '{list_name}' already exists. Overwrite? Type YES to continue: "
         ).strip()
 
@@ -69,8 +244,8 @@ def process_list(
         session=session,
         site_url=site_url,
         title=list_name,
-        desc=desc,
-        base_template=base_template,
+        desc=spec.description,
+        base_template=spec.base_template,
     )
 
     list_id = created["Id"]
@@ -82,43 +257,15 @@ def process_list(
     view_uri = view_info["__metadata"]["uri"]
 
     # ------------------------------------------------------
-    # Create fields
+    # Create fields, set Hidden, rebuild the view — one $batch
+    # (chunked) instead of a POST per field and per view column
     # ------------------------------------------------------
-    field_rows = fields_df[fields_df["ListName"] == list_name]
-
-    for _, field in field_rows.iterrows():
-        xml = build_field_xml(field)
-        created_field = sp.create_field(
-            session=session,
-            site_url=site_url,
-            list_id=list_id,
-            field_xml=xml,
-        )
-        field_id = created_field["Id"]
-
-        hidden = str(field.get("Hidden", "")).strip().upper() == "TRUE"
-        if hidden:
-            sp.update_field_hidden(
-                session=session,
-                site_url=site_url,
-                list_id=list_id,
-                field_id=field_id,
-                hidden=True,
-            )
+    ops = []
+    for field in spec.fields:
+        ops += _create_ops(site_url, list_id, field)
+    ops += _view_ops(view_uri, _view_names(spec.fields))
 
-    # ------------------------------------------------------
-    # Reset view fields silently
-    # ------------------------------------------------------
-    sp.clear_view_fields(session, view_uri)
-
-    # ------------------------------------------------------
-    # Add visible fields back to the view
-    # ------------------------------------------------------
-    for _, field in field_rows.iterrows():
-        internal = field["InternalName"]
-        show = str(field.get("ShowInView", "")).strip().upper() != "FALSE"
-        if show:
-            sp.add_view_field(session, view_uri, internal)
+    _run_ops(session, site_url, ops)
 
     # ------------------------------------------------------
     # Success
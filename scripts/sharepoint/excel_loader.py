@@ -1,10 +1,12 @@
 # excel_loader.py
 # Load the Excel schema registry WITHOUT writing anything back to it.
 
+import hashlib
 import os
+import pickle
 import sys
 import pandas as pd
-from .config import SCHEMA_PATH
+from .config import SCHEMA_PATH, REGISTRY_CACHE_PATH
 
 
 def fatal(msg: str) -> None:
@@ -12,14 +14,73 @@ def fatal(msg: str) -> None:
     sys.exit(1)
 
 
-def load_schema_excel():
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Compiled registry cache — keyed by the workbook's mtime/size and SHA-256
+# ---------------------------------------------------------------------------
+def _load_cached(stat: os.stat_result):
+    """
+    Returns (df_lists, df_fields) if the cache matches the workbook, else None.
+    Same mtime + size → trusted without hashing; otherwise the content hash
+    decides (a touched-but-unchanged workbook is not re-parsed).
+    """
+    try:
+        with open(REGISTRY_CACHE_PATH, "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        # Missing, truncated, or pickled by an incompatible pandas — rebuild
+        return None
+
+    if (cached.get("mtime_ns"), cached.get("size")) == (stat.st_mtime_ns, stat.st_size):
+        return cached["lists"], cached["fields"]
+
+    if cached.get("sha256") == _file_hash(SCHEMA_PATH):
+        _save_cached(cached["lists"], cached["fields"], stat, cached["sha256"])
+        return cached["lists"], cached["fields"]
+
+    return None
+
+
+def _save_cached(df_lists, df_fields, stat: os.stat_result, sha256: str = "") -> None:
+    try:
+        os.makedirs(os.path.dirname(REGISTRY_CACHE_PATH), exist_ok=True)
+        tmp = REGISTRY_CACHE_PATH + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": sha256 or _file_hash(SCHEMA_PATH),
+                "lists": df_lists,
+                "fields": df_fields,
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, REGISTRY_CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️  Could not write registry cache: {e}")
+
+
+def load_schema_excel(use_cache: bool = True):
     """
     Loads ONLY the schema sheets (Lists, Fields).
     DOES NOT load or save any ExecutionLog.
+    Reuses the compiled cache at REGISTRY_CACHE_PATH while the workbook is unchanged.
     """
     if not os.path.exists(SCHEMA_PATH):
         fatal(f"Schema registry not found at {SCHEMA_PATH}")
 
+    stat = os.stat(SCHEMA_PATH)
+    if use_cache:
+        cached = _load_cached(stat)
+        if cached is not None:
+            print(f"\n📄 Schema loaded from cache (workbook unchanged): {SCHEMA_PATH}")
+            return cached
+
     print(f"\n📄 Loading schema from: {SCHEMA_PATH}")
     xl = pd.ExcelFile(SCHEMA_PATH)
 
@@ -29,5 +90,8 @@ def load_schema_excel():
     except ValueError as e:
         fatal(f"Missing required sheet in Excel: {e}")
 
+    if use_cache:
+        _save_cached(df_lists, df_fields, stat)
+
     print("✅ Schema workbook loaded")
     return df_lists, df_fields
@@ -1,48 +1,55 @@
 # field_builder.py
 
-from typing import Dict
+from typing import List
 
-def build_field_xml(field_row: Dict) -> str:
+# Registry Type aliases (lower-case) → SharePoint TypeAsString
+TYPE_MAP = {
+    "number": "Number",
+    "int": "Number",
+    "integer": "Number",
+    "float": "Number",
+    "double": "Number",
+    "counter": "Counter",
+    "autonumber": "Counter",
+    # Add other aliases as needed
+}
+
+
+def normalize_type(type_raw) -> str:
     """
-    Build SharePoint Field XML based on schema row.
-    Adds normalization so that Type is case-insensitive:
+    Registry Type → SharePoint TypeAsString. Case-insensitive:
         number, Number, NUMBER, int, integer → Number
     """
-
-    display_name = field_row["DisplayName"]
-    internal_name = field_row["InternalName"]
-    required = str(field_row.get("Required", "")).strip().upper() == "TRUE"
-    type_raw = str(field_row["Type"]).strip()
-
-    # ------------------------------------------------------
-    # NORMALIZE TYPE (fix 'number' issue)
-    # ------------------------------------------------------
+    type_raw = str(type_raw).strip()
     type_normalized = type_raw.lower()
 
-    type_map = {
-        "number": "Number",
-        "int": "Number",
-        "integer": "Number",
-        "float": "Number",
-        "double": "Number",
-        "counter": "Counter",
-        "autonumber": "Counter",
-        # Add other aliases as needed
-    }
-
     # Use mapping or fall back to capitalized original
-    sp_type = type_map.get(type_normalized, None)
+    sp_type = TYPE_MAP.get(type_normalized, None)
 
     if sp_type is None:
         # Fallback: capitalize (Text → Text, Choice → Choice)
         sp_type = type_raw[0].upper() + type_raw[1:]
 
+    return sp_type
+
+
+def parse_choices(choices_raw) -> List[str]:
+    """'A; B;C' → ['A', 'B', 'C']"""
+    return [c.strip() for c in str(choices_raw or "").split(";") if c.strip()]
+
+
+def build_field_xml(field) -> str:
+    """
+    Build SharePoint Field XML from a compiled FieldSpec (model.py),
+    whose type is already normalized by normalize_type().
+    """
+
     # ------------------------------------------------------
     # BUILD BASE XML
     # ------------------------------------------------------
-    xml = f'<Field Type="{sp_type}" Name="{internal_name}" DisplayName="{display_name}"'
+    xml = f'<Field Type="{field.type}" Name="{field.internal_name}" DisplayName="{field.display_name}"'
 
-    if required:
+    if field.required:
         xml += ' Required="TRUE"'
 
     xml += ">"
@@ -50,13 +57,11 @@ def build_field_xml(field_row: Dict) -> str:
     # ------------------------------------------------------
     # Choice fields
     # ------------------------------------------------------
-    if sp_type == "Choice":
-        choices_raw = field_row.get("Choices", "")
-        if choices_raw:
-            xml += "<CHOICES>"
-            for c in str(choices_raw).split(";"):
-                xml += f"<CHOICE>{c.strip()}</CHOICE>"
-            xml += "</CHOICES>"
+    if field.type == "Choice" and field.choices:
+        xml += "<CHOICES>"
+        for c in field.choices:
+            xml += f"<CHOICE>{c}</CHOICE>"
+        xml += "</CHOICES>"
 
     xml += "</Field>"
 
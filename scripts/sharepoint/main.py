@@ -7,15 +7,26 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import argparse
+import time
 import uuid
-from typing import Any, Dict
-
 import pandas as pd
 
 from .auth import load_environment, acquire_token, make_session
+from .config import MAX_WORKERS, MAX_PER_SITE, SNAPSHOT_CACHE_DIR
 from .excel_loader import load_schema_excel
-from .validators import parse_bool, validate_list_row
-from .engine import process_list
+from .model import compile_registry
+from .validators import validate_registry
+from .runner import provision_lists, print_summary
+
+
+def _positive_int(value: str) -> int:
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a whole number, got {value!r}")
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
 
 
 def get_args() -> argparse.Namespace:
@@ -25,6 +36,28 @@ def get_args() -> argparse.Namespace:
         action="store_true",
         help="Validate schema without making changes to SharePoint.",
     )
+    parser.add_argument(
+        "--recreate",
+        action="store_true",
+        help="Delete and rebuild existing lists (asks first) instead of reconciling their fields.",
+    )
+    parser.add_argument(
+        "--snapshot-cache",
+        action="store_true",
+        help="Keep site snapshots on disk and reuse them while SharePoint's ETag is unchanged.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=_positive_int,
+        default=MAX_WORKERS,
+        help=f"Lists provisioned in parallel (default {MAX_WORKERS}).",
+    )
+    parser.add_argument(
+        "--per-site",
+        type=_positive_int,
+        default=MAX_PER_SITE,
+        help=f"Lists provisioned in parallel on one site (default {MAX_PER_SITE}).",
+    )
     return parser.parse_args()
 
 
@@ -41,21 +74,7 @@ def main() -> None:
         return
 
     # ============================================================
-    # 2. Authentication / DryRun
-    # ============================================================
-    if args.dryrun:
-        print("\n🔎 DRY-RUN MODE: No SharePoint calls will be made.")
-        session = None
-    else:
-        try:
-            token = acquire_token(tenant, client)
-        except Exception as e:
-            print(f"\n❌ Failed to acquire token: {e}")
-            return
-        session = make_session(token)
-
-    # ============================================================
-    # 3. Load Excel Schema (Lists + Fields)
+    # 2. Load + validate Excel Schema (Lists + Fields) — before any network call
     # ============================================================
     try:
         df_lists, df_fields = load_schema_excel()
@@ -63,49 +82,61 @@ def main() -> None:
         print(f"\n❌ Failed to load schema workbook: {e}")
         return
 
-    # Convert Enabled & CreateFlag into booleans
-    df_lists["Enabled_bool"] = df_lists["Enabled"].apply(parse_bool)
-    df_lists["CreateFlag_bool"] = df_lists["CreateFlag"].apply(parse_bool)
+    t0 = time.perf_counter()
+    problems = validate_registry(df_lists, df_fields)
+    if problems:
+        print(f"\n❌ Schema registry has {len(problems)} problem(s):")
+        for p in problems:
+            print(f"   • {p}")
+        return
+    print(f"✅ Registry valid: {len(df_lists)} lists, {len(df_fields)} fields "
+          f"({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+    # Compile once: normalized columns, fields grouped by list and sorted by Order
+    registry = compile_registry(df_lists, df_fields)
 
-    # Filter lists to process
-    df_targets = df_lists[(df_lists["Enabled_bool"]) & (df_lists["CreateFlag_bool"])]
+    # Filter lists to process (Enabled=TRUE and CreateFlag=TRUE)
+    targets = [spec for spec in registry if spec.enabled and spec.create_flag]
 
-    if df_targets.empty:
+    if not targets:
         print("\n⚠️  No active lists (Enabled=TRUE and CreateFlag=TRUE).")
         return
 
+    # ============================================================
+    # 3. Authentication / DryRun
+    # ============================================================
+    if args.dryrun:
+        print("\n🔎 DRY-RUN MODE: No SharePoint calls will be made.")
+        session = None
+    else:
+        try:
+            token = acquire_token(tenant, client)
+        except Exception as e:
+            print(f"\n❌ Failed to acquire token: {e}")
+            return
+        session = make_session(token)
+
     run_id = str(uuid.uuid4())
 
     print(f"\n🚀 DayPilot Schema Engine Starting")
     print(f"RunId: {run_id}")
-    print(f"Lists to process: {len(df_targets)}")
+    print(f"Lists to process: {len(targets)}")
 
     # ============================================================
-    # 4. Process lists
+    # 4. Process lists (independent lists in parallel)
     # ============================================================
-    for _, row in df_targets.iterrows():
-        list_name = str(row["ListName"]).strip()
-
-        try:
-            validate_list_row(row)
-
-            result: Dict[str, Any] = process_list(
-                session=session,
-                list_row=row,
-                fields_df=df_fields,
-                run_id=run_id,
-                dry_run=args.dryrun,
-            )
-
-            # Simple console feedback; no Excel/LOG file writes
-            status = result.get("Status", "Unknown")
-            msg = result.get("Message", "")
-            url = result.get("ListUrl", "")
-            print(f"➡️  {list_name}: {status} — {msg} {url}")
-
-        except Exception as ex:
-            print(f"❌ Error processing '{list_name}': {ex}")
-
+    t0 = time.perf_counter()
+    results = provision_lists(
+        session=session,
+        targets=targets,
+        run_id=run_id,
+        dry_run=args.dryrun,
+        workers=args.workers,
+        per_site=args.per_site,
+        recreate=args.recreate,
+        cache_dir=SNAPSHOT_CACHE_DIR if args.snapshot_cache else None,
+    )
+    print_summary(results, time.perf_counter() - t0)
 
 if __name__ == "__main__":
     # Allow running as a module: python -m scripts.sharepoint.main
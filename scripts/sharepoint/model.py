@@ -0,0 +1,100 @@
+# model.py
+# Compiled, slotted schema model — the registry as the engine consumes it.
+
+import math
+from typing import Any, Dict, List
+
+from .field_builder import normalize_type, parse_choices
+from .validators import parse_bool, parse_int
+
+
+def _flag(value: Any) -> bool:
+    return str(value).strip().upper() == "TRUE"
+
+
+def _order(value: Any) -> float:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return math.inf
+    return math.inf if math.isnan(v) else v
+
+
+class FieldSpec:
+    """One Fields-sheet row. `type` is the SharePoint TypeAsString (normalize_type)."""
+
+    __slots__ = (
+        "list_name", "internal_name", "display_name", "type", "description",
+        "required", "read_only", "hidden", "choices", "num_lines", "indexed",
+        "default_value", "xml_override", "visible", "show_in_view", "order",
+    )
+
+    def __init__(self, row: Dict[str, Any]):
+        self.list_name = str(row.get("listname", "")).strip()
+        self.internal_name = str(row.get("internalname", "")).strip()
+        self.display_name = str(row.get("displayname", "")).strip()
+        raw_type = str(row.get("type", "")).strip()
+        self.type = normalize_type(raw_type) if raw_type else ""
+        self.description = str(row.get("description", ""))
+        self.required = _flag(row.get("required", ""))
+        self.read_only = _flag(row.get("readonly", ""))
+        self.hidden = _flag(row.get("hidden", ""))
+        self.choices = parse_choices(row.get("choices", ""))
+        self.num_lines = row.get("numlines", "")
+        self.indexed = _flag(row.get("indexed", ""))
+        self.default_value = row.get("defaultvalue", "")
+        self.xml_override = str(row.get("xmloverride", "")).strip()
+        self.visible = row.get("visible", "")
+        # Only an explicit FALSE keeps a field out of the default view
+        self.show_in_view = str(row.get("showinview", "")).strip().upper() != "FALSE"
+        self.order = _order(row.get("order", ""))
+
+    def __repr__(self) -> str:
+        return f"FieldSpec({self.list_name}.{self.internal_name}: {self.type})"
+
+
+class ListSpec:
+    """One Lists-sheet row plus its fields, sorted by Order (Excel order for ties/blanks)."""
+
+    __slots__ = (
+        "name", "site_url", "description", "base_template",
+        "enabled", "create_flag", "fields",
+    )
+
+    def __init__(self, row: Dict[str, Any], fields: List[FieldSpec]):
+        self.name = str(row.get("listname", "")).strip()
+        self.site_url = str(row.get("siteurl", "")).strip().rstrip("/")
+        self.description = str(row.get("description", "") or "")
+        self.base_template = parse_int(str(row.get("basetemplate", "")).strip(), 100)
+        self.enabled = parse_bool(row.get("enabled", ""))
+        self.create_flag = parse_bool(row.get("createflag", ""))
+        self.fields = sorted(fields, key=lambda f: f.order)
+
+    @property
+    def site_key(self) -> str:
+        return self.site_url.lower()
+
+    def __repr__(self) -> str:
+        return f"ListSpec({self.name} @ {self.site_url}, {len(self.fields)} fields)"
+
+
+def _records(df) -> List[Dict[str, Any]]:
+    """DataFrame rows as dicts keyed by normalized (stripped, lower-case) column name."""
+    cols = [str(c).strip().lower() for c in df.columns]
+    return [dict(zip(cols, values)) for values in df.itertuples(index=False, name=None)]
+
+
+def compile_registry(df_lists, df_fields) -> List[ListSpec]:
+    """
+    Compiles both sheets once: column names normalized, fields grouped by
+    ListName and sorted by Order, so nothing downstream filters a frame.
+    """
+    by_list: Dict[str, List[FieldSpec]] = {}
+    for row in _records(df_fields):
+        spec = FieldSpec(row)
+        by_list.setdefault(spec.list_name, []).append(spec)
+
+    return [
+        ListSpec(row, by_list.get(str(row.get("listname", "")).strip(), []))
+        for row in _records(df_lists)
+    ]
@@ -0,0 +1,175 @@
+# runner.py
+# Provisions independent lists concurrently, with global and per-site limits.
+
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from requests.adapters import HTTPAdapter
+
+from .engine import process_list
+from .model import ListSpec
+from .snapshot import load_site_snapshots
+from .validators import validate_list_row
+
+
+# ---------------------------------------------------------------------------
+# Per-thread console buffering — each list's output is printed as one block
+# ---------------------------------------------------------------------------
+class _ThreadStdout(io.TextIOBase):
+    """
+    Stands in for sys.stdout while lists run. Writes from a worker thread go
+    to that thread's buffer; everything else goes to the real stream.
+    """
+
+    def __init__(self, real):
+        self.real = real
+        self.local = threading.local()
+
+    def write(self, s: str) -> int:
+        buf = getattr(self.local, "buf", None)
+        return (buf or self.real).write(s)
+
+    def flush(self) -> None:
+        self.real.flush()
+
+
+_OUT_LOCK = threading.Lock()
+_PROMPT_LOCK = threading.Lock()
+
+
+def _confirm(out: _ThreadStdout, prompt: str) -> str:
+    """
+    Overwrite / column-delete prompts are asked one at a time, on the real console, after
+    showing what that list has printed so far.
+    """
+    with _PROMPT_LOCK:
+        with _OUT_LOCK:
+            out.real.write(out.local.buf.getvalue())
+            out.local.buf.seek(0)
+            out.local.buf.truncate()
+            out.real.write(prompt)
+            out.real.flush()
+        return sys.stdin.readline()
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+def _interleave_by_site(specs: List[ListSpec]) -> List[ListSpec]:
+    """
+    Round-robin over sites so early workers are not all queued on one site's
+    semaphore while other sites sit idle.
+    """
+    by_site: Dict[str, List[ListSpec]] = {}
+    for spec in specs:
+        by_site.setdefault(spec.site_key, []).append(spec)
+
+    queues = list(by_site.values())
+    ordered = []
+    while queues:
+        ordered.extend(q.pop(0) for q in queues)
+        queues = [q for q in queues if q]
+    return ordered
+
+
+def provision_lists(
+    session,
+    targets: List[ListSpec],
+    run_id: str,
+    dry_run: bool,
+    workers: int,
+    per_site: int,
+    recreate: bool = False,
+    cache_dir: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Runs process_list for every ListSpec in `targets` on a thread pool of
+    `workers`, with at most `per_site` lists in flight per SiteUrl. Each
+    site's lists, fields and views are snapshotted once up front (cached
+    under `cache_dir` when given).
+
+    Returns one result per list (ListName, Site, Status, Message, ListUrl,
+    Seconds), in the order lists finished.
+    """
+    # A zero/negative limit would deadlock the semaphores or break the pool
+    workers, per_site = max(1, workers), max(1, per_site)
+    specs = _interleave_by_site(targets)
+    site_locks = {s: threading.Semaphore(per_site) for s in {spec.site_key for spec in specs}}
+
+    if session is not None:
+        # One pooled connection per worker instead of requests' default of 10
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount("https://", adapter)
+
+    snapshots = load_site_snapshots(
+        session, {spec.site_url for spec in specs if spec.site_url}, cache_dir=cache_dir, workers=workers
+    )
+
+    out = _ThreadStdout(sys.stdout)
+    results: List[Dict[str, Any]] = []
+
+    def run(spec: ListSpec) -> None:
+        list_name = spec.name
+        site = spec.site_key
+        out.local.buf = io.StringIO()
+        t0 = time.perf_counter()
+
+        try:
+            with site_locks[site]:
+                validate_list_row(spec)
+                result: Dict[str, Any] = process_list(
+                    session=session,
+                    spec=spec,
+                    run_id=run_id,
+                    dry_run=dry_run,
+                    confirm=lambda prompt: _confirm(out, prompt),
+                    recreate=recreate,
+                    site_state=snapshots.get(site),
+                )
+            status = result.get("Status", "Unknown")
+            msg = result.get("Message", "")
+            url = result.get("ListUrl", "")
+            print(f"➡️  {list_name}: {status} — {msg} {url}")
+        except Exception as ex:
+            result = {"Status": "Error", "Message": str(ex), "ListUrl": ""}
+            print(f"❌ Error processing '{list_name}': {ex}")
+
+        result.update(ListName=list_name, Site=site, Seconds=round(time.perf_counter() - t0, 1))
+        with _OUT_LOCK:
+            out.real.write(out.local.buf.getvalue())
+            out.real.flush()
+            results.append(result)
+        out.local.buf = None
+
+    sys.stdout = out
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, specs))
+    finally:
+        sys.stdout = out.real
+
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Run summary
+# ---------------------------------------------------------------------------
+def print_summary(results: List[Dict[str, Any]], elapsed: float) -> None:
+    print("\n==============================")
+    print("📊 Run summary")
+    print("==============================")
+
+    width = max([len(r["ListName"]) for r in results] + [8])
+    for r in sorted(results, key=lambda r: (r["Site"], r["ListName"])):
+        icon = {"OK": "✅", "Skipped": "⏭️ ", "Error": "❌"}.get(r["Status"], "•")
+        print(f"{icon} {r['ListName']:<{width}}  {r['Status']:<8} {r['Seconds']:>6.1f}s  {r['Message']}")
+
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["Status"]] = counts.get(r["Status"], 0) + 1
+    tally = ", ".join(f"{n} {s}" for s, n in sorted(counts.items()))
+    print(f"\n{len(results)} lists in {elapsed:.1f}s — {tally}")
@@ -0,0 +1,76 @@
+# snapshot.py
+# Site-wide remote state: one expanded query per SiteUrl, optionally cached on disk.
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+
+from . import sp_api as sp
+
+
+def site_key(site_url: str) -> str:
+    return str(site_url).strip().rstrip("/").lower()
+
+
+def _cache_path(cache_dir: str, site_url: str) -> str:
+    name = hashlib.sha1(site_key(site_url).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"site-{name}.json")
+
+
+def _load_site(session, site_url: str, cache_dir: Optional[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    cached: Dict[str, Any] = {}
+    path = _cache_path(cache_dir, site_url) if cache_dir else ""
+
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+
+    try:
+        lists, etag = sp.get_site_state(session, site_url, etag=cached.get("ETag", ""))
+    except Exception as e:
+        # One bad site must not sink the others; its lists fall back to per-list lookups
+        print(f"⚠️  {site_url}: snapshot failed, checking lists individually — {e}")
+        return None
+
+    if lists is None:
+        print(f"🗂️  {site_url}: snapshot unchanged (ETag), using cache")
+        return cached["Lists"]
+
+    print(f"🗂️  {site_url}: {len(lists)} lists in snapshot")
+
+    # Without an ETag there is nothing to revalidate against, so nothing to cache
+    if path and etag:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"SiteUrl": site_url, "ETag": etag, "Lists": lists}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️  Could not write snapshot cache for {site_url}: {e}")
+
+    return lists
+
+
+def load_site_snapshots(
+    session,
+    site_urls: Iterable[str],
+    cache_dir: Optional[str] = None,
+    workers: int = 4,
+) -> Dict[str, Optional[Dict[str, Dict[str, Any]]]]:
+    """
+    Returns {site_key(site): {list title (lower): list state}} for every
+    distinct site, fetched in parallel. Existence checks and field/view
+    diffs in the engine then become dictionary lookups. A site whose
+    snapshot fails maps to None, and process_list queries it per list.
+    """
+    sites = {site_key(s): str(s).strip().rstrip("/") for s in site_urls}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sites) or 1))) as pool:
+        states = pool.map(lambda url: _load_site(session, url, cache_dir), sites.values())
+        return dict(zip(sites.keys(), states))
@@ -1,7 +1,12 @@
 # sp_api.py
 # Fully cleaned, warning-free SharePoint REST operations for DayPilot.
 
-from typing import Any, Dict, List, Optional
+import json
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import BATCH_LIMIT
 
 
 # ---------------------------------------------------------------------------
@@ -112,6 +117,64 @@ def create_list(session, site_url: str, title: str, desc: str, base_template: in
     return data
 
 
+# ---------------------------------------------------------------------------
+# SITE STATE — every list with its fields and default view in one query
+# ---------------------------------------------------------------------------
+_SITE_STATE_QUERY = (
+    "$select=Id,Title,DefaultViewUrl,Fields,DefaultView/ViewFields/Items"
+    "&$expand=Fields,DefaultView/ViewFields"
+    "&$filter=Hidden eq false"
+)
+
+
+def get_site_state(session, site_url: str, etag: str = "") -> Tuple[Optional[Dict[str, Dict[str, Any]]], str]:
+    """
+    Returns ({title.lower(): list}, etag). Each list carries Id, Title,
+    DefaultViewUrl, Fields (as get_fields returns them), ViewUri (as
+    get_default_view returns it) and ViewFields (as get_view_fields).
+
+    With `etag`, sends If-None-Match; a 304 returns (None, etag) so the
+    caller can reuse its copy.
+    """
+    if session is None:
+        _print_dry(f"Would snapshot lists, fields and views at {site_url}")
+        return {}, ""
+
+    url = _clean_url(f"{site_url}/_api/web/lists") + "?" + _SITE_STATE_QUERY
+    headers = {"If-None-Match": etag} if etag else {}
+    lists: Dict[str, Dict[str, Any]] = {}
+
+    while url:
+        resp = session.get(url, headers=headers)
+        if resp.status_code == 304:
+            return None, etag
+        if resp.status_code != 200:
+            raise RuntimeError(
+                f"Failed to snapshot site {site_url}: {resp.status_code} {resp.text}"
+            )
+
+        etag = resp.headers.get("ETag", "") if not lists else etag
+        data = resp.json()
+        for item in _parse_collection(data):
+            fields = item.get("Fields") or []
+            view = (item.get("DefaultView") or {}).get("ViewFields") or {}
+            view_items = view.get("Items", [])
+            lists[item["Title"].lower()] = {
+                "Id": item["Id"],
+                "Title": item["Title"],
+                "DefaultViewUrl": item.get("DefaultViewUrl", ""),
+                "Fields": _parse_collection(fields) if isinstance(fields, dict) else fields,
+                "ViewUri": _clean_url(f"{site_url}/_api/web/lists(guid'{item['Id']}')/DefaultView"),
+                "ViewFields": view_items.get("results", []) if isinstance(view_items, dict) else view_items,
+            }
+
+        inner = data.get("d", data)
+        url = inner.get("odata.nextLink") or inner.get("@odata.nextLink") or inner.get("__next")
+        headers = {}
+
+    return lists, etag
+
+
 # ---------------------------------------------------------------------------
 # FIELD OPERATIONS
 # ---------------------------------------------------------------------------
@@ -197,6 +260,26 @@ def get_default_view(session, site_url: str, list_id: str) -> Dict[str, Any]:
     return {"__metadata": {"uri": url}}
 
 
+def get_view_fields(session, view_uri: str) -> List[str]:
+    if session is None:
+        _print_dry("Would query view fields")
+        return []
+
+    url = _clean_url(f"{view_uri}/ViewFields")
+    resp = session.get(url)
+
+    if resp.status_code != 200:
+        raise RuntimeError(
+            f"Failed to query view fields: {resp.status_code} {resp.text}"
+        )
+
+    data = _parse_single(resp.json())
+    items = data.get("Items", [])
+    if isinstance(items, dict):
+        items = items.get("results", [])
+    return list(items)
+
+
 def clear_view_fields(session, view_uri: str) -> None:
     if session is None:
         _print_dry("Would clear view fields")
@@ -227,3 +310,186 @@ def add_view_field(session, view_uri: str, internal_name: str) -> None:
         raise RuntimeError(
             f"Failed to add view field {internal_name}: {resp.status_code} {resp.text}"
         )
+
+
+# ---------------------------------------------------------------------------
+# BATCH OPERATIONS — many writes per round-trip via $batch
+#
+# Each operation is its own changeset, so one failure does not roll back or
+# hide its neighbours; SharePoint runs them in order, which lets a field be
+# created and then updated by InternalName in the same batch.
+# ---------------------------------------------------------------------------
+# SP.AddFieldOptions.addFieldInternalNameHint — keep the schema's Name as the
+# InternalName instead of deriving it from DisplayName, so later lookups by
+# InternalName (Hidden, reconcile diffs) find the field
+_ADD_FIELD_INTERNAL_NAME_HINT = 8
+
+
+def create_field_op(site_url: str, list_id: str, field_xml: str, label: str = "") -> Dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": _clean_url(f"{site_url}/_api/web/lists(guid'{list_id}')/fields/CreateFieldAsXml"),
+        "payload": {"parameters": {"SchemaXml": field_xml, "Options": _ADD_FIELD_INTERNAL_NAME_HINT}},
+        "label": label or "create field",
+    }
+
+
+def update_field_hidden_op(site_url: str, list_id: str, internal_name: str, hidden: bool) -> Dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": _clean_url(
+            f"{site_url}/_api/web/lists(guid'{list_id}')/fields/"
+            f"getbyinternalnameortitle('{internal_name}')"
+        ),
+        "payload": {"Hidden": hidden},
+        "headers": {"IF-MATCH": "*", "X-HTTP-Method": "MERGE"},
+        "label": internal_name,
+    }
+
+
+def update_field_op(site_url: str, list_id: str, internal_name: str, props: Dict[str, Any],
+                    sp_type: str = "SP.Field") -> Dict[str, Any]:
+    """MERGE `props` onto a field; Choices etc. need the derived sp_type (e.g. SP.FieldChoice)."""
+    payload = {"__metadata": {"type": sp_type}}
+    for key, value in props.items():
+        payload[key] = {"results": value} if isinstance(value, list) else value
+    return {
+        "method": "POST",
+        "url": _clean_url(
+            f"{site_url}/_api/web/lists(guid'{list_id}')/fields/"
+            f"getbyinternalnameortitle('{internal_name}')"
+        ),
+        "payload": payload,
+        "headers": {
+            "Content-Type": "application/json;odata=verbose",
+            "IF-MATCH": "*",
+            "X-HTTP-Method": "MERGE",
+        },
+        "label": internal_name,
+    }
+
+
+def delete_field_op(site_url: str, list_id: str, field_id: str, label: str = "") -> Dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": _clean_url(f"{site_url}/_api/web/lists(guid'{list_id}')/fields(guid'{field_id}')"),
+        "headers": {"IF-MATCH": "*", "X-HTTP-Method": "DELETE"},
+        "label": label or field_id,
+    }
+
+
+def clear_view_fields_op(view_uri: str) -> Dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": _clean_url(f"{view_uri}/ViewFields/RemoveAll()"),
+        "label": "view",
+        "expect": (200, 204, 404),
+    }
+
+
+def add_view_field_op(view_uri: str, internal_name: str) -> Dict[str, Any]:
+    return {
+        "method": "POST",
+        "url": _clean_url(f"{view_uri}/ViewFields/addViewField"),
+        "payload": {"strField": internal_name},
+        "label": internal_name,
+    }
+
+
+def _batch_body(ops: List[Dict[str, Any]], boundary: str) -> str:
+    lines: List[str] = []
+    for op in ops:
+        changeset = f"changeset_{uuid.uuid4()}"
+        lines += [
+            f"--{boundary}",
+            f"Content-Type: multipart/mixed; boundary={changeset}",
+            "",
+            f"--{changeset}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            "",
+            f"{op['method']} {op['url']} HTTP/1.1",
+            "Accept: application/json;odata=nometadata",
+        ]
+        headers = {"Content-Type": "application/json", **(op.get("headers") or {})}
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        lines += ["", json.dumps(op["payload"]) if op.get("payload") is not None else "", f"--{changeset}--"]
+    lines += [f"--{boundary}--", ""]
+    return "\r\n".join(lines)
+
+
+_HTTP_STATUS = re.compile(r"^HTTP/1\.1 (\d{3})[^\n]*$", re.M)
+
+
+def _parse_batch_response(text: str) -> List[Dict[str, Any]]:
+    """
+    Returns [{"status": int, "body": str}] in response order. Each inner
+    response is "HTTP/1.1 <code> ..." + headers + blank line + body, up to
+    the next boundary line.
+    """
+    parts = []
+    for m in _HTTP_STATUS.finditer(text):
+        rest = text[m.end():]
+        head_end = re.search(r"\r?\n\r?\n", rest)
+        body = rest[head_end.end():] if head_end else ""
+        body = re.split(r"^--", body, maxsplit=1, flags=re.M)[0].strip()
+        parts.append({"status": int(m.group(1)), "body": body})
+    return parts
+
+
+def _batch_error(body: str) -> str:
+    try:
+        err = json.loads(body)
+        err = err.get("odata.error") or err.get("error") or err
+        msg = err.get("message", err)
+        return msg.get("value", str(msg)) if isinstance(msg, dict) else str(msg)
+    except (ValueError, AttributeError):
+        return body[:300]
+
+
+def execute_batch(session, site_url: str, ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sends `ops` (built by the *_op helpers) to {site}/_api/$batch in chunks
+    of BATCH_LIMIT. Returns one result per op, in order:
+        {"label", "ok", "status", "data", "error"}
+    Transport-level failures raise RuntimeError; per-operation failures are
+    reported in the result instead.
+    """
+    if session is None:
+        for op in ops:
+            _print_dry(f"Would batch {op['method']} {op['url'].split('/_api/', 1)[-1]} ({op['label']})")
+        return [{"label": op["label"], "ok": True, "status": 200,
+                 "data": {"Id": "00000000-0000-0000-0000-000000000000"}, "error": ""} for op in ops]
+
+    url = _clean_url(f"{site_url}/_api/$batch")
+    results: List[Dict[str, Any]] = []
+
+    for i in range(0, len(ops), BATCH_LIMIT):
+        chunk = ops[i:i + BATCH_LIMIT]
+        boundary = f"batch_{uuid.uuid4()}"
+        resp = session.post(
+            url,
+            data=_batch_body(chunk, boundary).encode("utf-8"),
+            headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+        )
+        if resp.status_code not in (200, 202):
+            raise RuntimeError(f"Batch request failed: {resp.status_code} {resp.text}")
+
+        parts = _parse_batch_response(resp.text)
+        for j, op in enumerate(chunk):
+            if j >= len(parts):
+                results.append({"label": op["label"], "ok": False, "status": 0, "data": {},
+                                "error": "No response for operation in batch"})
+                continue
+            status, body = parts[j]["status"], parts[j]["body"]
+            ok = status in op.get("expect", (200, 201, 204))
+            data: Dict[str, Any] = {}
+            if ok and body:
+                try:
+                    data = _parse_created_field(json.loads(body))
+                except ValueError:
+                    pass
+            results.append({"label": op["label"], "ok": ok, "status": status, "data": data,
+                            "error": "" if ok else f"{status} {_batch_error(body)}"})
+
+    return results
@@ -1,9 +1,16 @@
 # validators.py
 # Validates Excel schema rows for the SharePoint engine.
 
-from typing import Any
+from typing import TYPE_CHECKING, Any, List
+
 import pandas as pd
 
+from .config import KNOWN_FIELD_TYPES
+from .field_builder import TYPE_MAP
+
+if TYPE_CHECKING:
+    from .model import ListSpec
+
 
 def fatal(msg: str):
     raise ValueError(msg)
@@ -28,52 +35,93 @@ def parse_int(value: Any, default: int | None = None) -> int | None:
         return default
 
 
-def validate_list_row(list_name_row: pd.Series):
-    if not str(list_name_row.get("ListName", "")).strip():
+def validate_list_row(spec: "ListSpec"):
+    if not spec.name:
         fatal("List row missing ListName")
-    if not str(list_name_row.get("SiteURL", "")).strip():
-        fatal(f"List '{list_name_row.get('ListName')}' missing SiteURL")
-
-
-def validate_field_rows(list_name: str, fields_df: pd.DataFrame) -> pd.DataFrame:
+    if not spec.site_url:
+        fatal(f"List '{spec.name}' missing SiteURL")
+
+
+# ---------------------------------------------------------------------------
+# Whole-registry pass — every problem at once, before any network call
+# ---------------------------------------------------------------------------
+REQUIRED_LIST_COLUMNS = ["ListName", "SiteURL", "Enabled", "CreateFlag"]
+
+REQUIRED_FIELD_COLUMNS = [
+    "ListName",
+    "InternalName",
+    "DisplayName",
+    "Type",
+    "Description",
+    "Required",
+    "ReadOnly",
+    "Hidden",
+    "Choices",
+    "NumLines",       # required column, but no validation
+    "Indexed",
+    "DefaultValue",
+    "XMLOverride",
+    "Visible",
+    "Order",
+]
+
+
+def _normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """Same column normalization as model.compile_registry, cells as stripped strings."""
+    out = df.astype(str).apply(lambda col: col.str.strip())
+    out.columns = [str(c).strip().lower() for c in df.columns]
+    return out
+
+
+def _where(sheet: str, rows: pd.DataFrame, msg) -> List[str]:
+    # Excel row = frame index + 2 (header row, 1-based); msg is a str or a per-row Series
+    labels = rows["listname"] + "." + rows["internalname"] if "internalname" in rows else rows["listname"]
+    msgs = [msg] * len(rows) if isinstance(msg, str) else list(msg)
+    return [f"{sheet} row {i + 2} ({label}): {m}" for i, label, m in zip(rows.index, labels, msgs)]
+
+
+def validate_registry(df_lists: pd.DataFrame, df_fields: pd.DataFrame) -> List[str]:
     """
-    Returns only fields belonging to this list.
-    Performs required-column validation.
-    DOES NOT validate NumLines anymore.
+    Validates both sheets column-wise in one pass and returns every problem
+    found (empty list = valid):
+        missing required columns on either sheet
+        active lists (Enabled + CreateFlag) missing ListName/SiteURL or with no fields
+        fields with no InternalName, duplicate InternalNames within a list
+        unknown Types, Choice/MultiChoice fields with empty Choices
     """
-
-    required_cols = [
-        "ListName",
-        "InternalName",
-        "DisplayName",
-        "Type",
-        "Description",
-        "Required",
-        "ReadOnly",
-        "Hidden",
-        "Choices",
-        "NumLines",       # required column, but no validation
-        "Indexed",
-        "DefaultValue",
-        "XMLOverride",
-        "Visible",
-        "Order",
-    ]
-
-    for col in required_cols:
-        if col not in fields_df.columns:
-            fatal(f"Fields sheet missing required column '{col}'")
-
-    # Filter rows for this list
-    rows = fields_df[fields_df["ListName"] == list_name]
-
-    if rows.empty:
-        fatal(f"Fields sheet contains no rows for list '{list_name}'")
-
-    # No NumLines validation here — IGNORE COMPLETELY
-
-    # Sort by Order if present, else preserve Excel row order
-    if "Order" in rows.columns and rows["Order"].notna().any():
-        rows = rows.sort_values(by="Order", ascending=True)
-
-    return rows.reset_index(drop=True)
+    problems: List[str] = []
+    lists, fields = _normalized(df_lists), _normalized(df_fields)
+
+    for sheet, df, required in (("Lists", lists, REQUIRED_LIST_COLUMNS),
+                                ("Fields", fields, REQUIRED_FIELD_COLUMNS)):
+        missing = [c for c in required if c.lower() not in df.columns]
+        if missing:
+            problems.append(f"{sheet} sheet missing required column(s): {', '.join(missing)}")
+
+    # Row checks need the key columns; column problems are reported above
+    if problems:
+        return problems
+
+    truthy = ("true", "yes", "1", "y")
+    active = lists[lists["enabled"].str.lower().isin(truthy) & lists["createflag"].str.lower().isin(truthy)]
+
+    problems += _where("Lists", active[active["listname"] == ""], "missing ListName")
+    problems += _where("Lists", active[active["siteurl"] == ""], "missing SiteURL")
+    named = active[active["listname"] != ""]
+    problems += _where("Lists", named[~named["listname"].isin(fields["listname"])], "no rows on the Fields sheet")
+
+    problems += _where("Fields", fields[fields["internalname"] == ""], "missing InternalName")
+    keyed = fields[fields["internalname"] != ""]
+    dupes = keyed[keyed.duplicated(["listname", "internalname"], keep="first")]
+    problems += _where("Fields", dupes, "duplicate InternalName in this list")
+
+    raw = fields["type"]
+    sp_type = raw.str.lower().map(TYPE_MAP).fillna(raw.str[:1].str.upper() + raw.str[1:])
+    problems += _where("Fields", fields[raw == ""], "missing Type")
+    unknown = fields[(raw != "") & ~sp_type.isin(KNOWN_FIELD_TYPES)]
+    problems += _where("Fields", unknown, "unknown Type '" + unknown["type"] + "'")
+
+    no_choices = fields[sp_type.isin(["Choice", "MultiChoice"]) & (fields["choices"].str.strip(" ;") == "")]
+    problems += _where("Fields", no_choices, "Choice field has no Choices")
+
+    return problems
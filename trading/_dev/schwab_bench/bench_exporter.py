@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Exporter Benchmark
+----------------------------------------------------------------------------
+
+Purpose:
+    Runs PositionsExporter-Schwab.py's Exporter.phase1 / phase2 against the local
+    fake Schwab API (fake_schwab.py) for a range of book sizes and records wall
+    time, API calls per position, bytes served and peak Python memory — so a
+    performance change can be proven offline, before it touches the live API.
+
+Notes:
+    • Every CONFIG path is redirected into a temp dir; nothing under Working_Files is touched.
+    • The rate governor is opened up unless `--quota` is given, so the numbers measure the
+      exporter rather than Schwab's 120 req/min budget.
+    • Peak memory comes from tracemalloc, which slows Python-heavy phases; pass `--no-memory`
+      for clean wall-time numbers.
+
+Usage:
+    python bench_exporter.py --sizes 100 1000 5000 --latency 0.04 --workers 8
+    python bench_exporter.py --sizes 1000 --p429 0.05 --quota --json bench.json
+
+-------------------------------------------------------------------------------
+"""
+
+import argparse, contextlib, importlib.util, io, json, os, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_schwab import Book, FakeSchwab
+
+EXPORTER = Path(__file__).resolve().parents[2] / "active" / "PositionsExporter-Schwab.py"
+URL_KEYS = ("TOKEN_URL", "ACCT_URL", "CHAINS_URL", "QUOTES_URL")
+
+# --------------------------------------------------------------------------
+# Helpers
+# --------------------------------------------------------------------------
+def load_exporter() -> ModuleType:
+    os.environ.update(SCHWAB_API_BASE="http://127.0.0.1:1", SCHWAB_CLIENT_ID="bench",
+                      SCHWAB_CLIENT_SECRET="bench", SCHWAB_REDIRECT_URI="https://127.0.0.1")
+    spec = importlib.util.spec_from_file_location("positions_exporter", EXPORTER)
+    if spec is None or spec.loader is None:
+        raise SystemExit(f"❌ Cannot load exporter from {EXPORTER}")
+    m = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(m)
+    return m
+
+def point(m: ModuleType, base: str, tmp: Path, quota: bool):
+    """Aims the exporter's CONFIG at the fake server and a scratch directory."""
+    for k in URL_KEYS:
+        m.CONFIG[k] = base + "/" + m.CONFIG[k].split("/", 3)[3]
+    for k, v in list(m.CONFIG.items()):
+        if isinstance(v, Path):
+            m.CONFIG[k] = tmp / v.name
+    if not quota:
+        m.CONFIG["RATE_LIMITS"] = {k: 1e9 for k in m.CONFIG["RATE_LIMITS"]}
+    m.CONFIG["TOKEN_PATH"].write_text(json.dumps({"refresh_token": "bench"}))
+
+@contextlib.contextmanager
+def timed(out: Dict[str, float], key: str):
+    t = time.perf_counter()
+    yield
+    out[key] = round(time.perf_counter() - t, 3)
+
+# --------------------------------------------------------------------------
+# Benchmark
+# --------------------------------------------------------------------------
+def bench(m: ModuleType, n: int, a: argparse.Namespace) -> Dict[str, Any]:
+    fake = FakeSchwab(Book(n, a.accounts, a.strikes), a.latency, a.p429, retry_after=a.retry_after).start()
+    try:
+        point(m, fake.url, Path(tempfile.mkdtemp(prefix="schwab-bench-")), a.quota)
+        c = m.Client(a.workers)
+        auth = m.SchwabAuth(c)
+        auth.token()
+        r = c.get(m.CONFIG["ACCT_URL"], params={"fields": "positions"})
+        r.raise_for_status()
+        accounts = r.json()
+        fake.reset()
+
+        res: Dict[str, Any] = {"positions": n}
+        e = m.Exporter()
+        if a.memory:
+            tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            with timed(res, "phase1_s"):
+                rows = e.phase1(accounts)
+            with timed(res, "phase2_s"):
+                e.phase2(rows, c, a.workers, None, a.local_greeks)
+            if a.memory:
+                res["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                tracemalloc.stop()
+            with timed(res, "save_s"):
+                e.save(rows, e.exposure(rows))
+        calls = sum(v for k, v in fake.counts.items() if k != "429")
+        res.update({
+            "options": sum(1 for x in rows if x.assetType == "OPTION"),
+            "enriched": sum(1 for x in rows if x.GreeksSource),
+            "api_calls": calls,
+            "calls_per_position": round(calls / max(n, 1), 4),
+            "by_endpoint": dict(fake.counts),
+            "mb_served": round(fake.bytes / 2 ** 20, 2),
+            "retries": c.retries,
+        })
+        if a.verbose:
+            print(log.getvalue())
+        auth.close()
+        return res
+    finally:
+        fake.stop()
+
+def report(results: List[Dict[str, Any]]):
+    cols = ["positions", "options", "enriched", "phase1_s", "phase2_s", "save_s", "api_calls",
+            "calls_per_position", "mb_served", "retries", "peak_mb"]
+    print("\n" + " ".join(f"{c:>18}" for c in cols))
+    for r in results:
+        print(" ".join(f"{str(r.get(c, '—')):>18}" for c in cols))
+
+# --------------------------------------------------------------------------
+# Entry
+# --------------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the Schwab positions exporter against a local fake API")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Book sizes (positions)")
+    ap.add_argument("--accounts", type=int, default=2)
+    ap.add_argument("--strikes", type=int, default=40, help="Synthetic strikes per expiry in each chain")
+    ap.add_argument("--latency", type=float, default=0.04, help="Seconds of server latency per request (±50%%)")
+    ap.add_argument("--p429", type=float, default=0.0, help="Probability of a 429 per request")
+    ap.add_argument("--retry-after", default="1", help="Retry-After header sent with injected 429s")
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--local-greeks", action="store_true", help="Benchmark the --local-greeks path")
+    ap.add_argument("--quota", action="store_true", help="Keep the exporter's real per-minute rate limits")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="Skip tracemalloc peak memory")
+    ap.add_argument("--json", type=Path, help="Also write results to this JSON file")
+    ap.add_argument("-v", "--verbose", action="store_true", help="Show exporter console output")
+    a = ap.parse_args()
+
+    m = load_exporter()
+    results = []
+    for n in a.sizes:
+        print(f"⏱ {n} positions …", flush=True)
+        results.append(bench(m, n, a))
+    report(results)
+    if a.json:
+        a.json.write_text(json.dumps(results, indent=2))
+        print(f"\n💾 {a.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Fake Schwab API
+----------------------------------------------------------------------------
+
+Purpose:
+    Local stand-in for the Schwab endpoints PositionsExporter-Schwab.py talks to,
+    serving a synthetic book so exporter throughput can be measured offline.
+
+Endpoints:
+    POST /v1/oauth/token            → access/refresh token (expires_in 1800)
+    GET  /trader/v1/accounts        → securitiesAccount list with positions
+    GET  /marketdata/v1/chains      → symbol/contractType/fromDate/toDate[/strike]
+    GET  /marketdata/v1/quotes      → symbols=A,B,C (quote + fundamental)
+    GET  /marketdata/v1/{sym}/quotes
+    GET  /_stats                    → request counts per endpoint
+
+Knobs:
+    positions   : book size (options ≈ 90%, stock ≈ 10%)
+    latency     : seconds added to every response (±50% jitter)
+    p429        : probability a request is answered 429 with Retry-After
+    strikes     : extra synthetic strikes per expiry, so chain payloads look real
+
+Usage:
+    python fake_schwab.py --positions 1000 --latency 0.05 --p429 0.02 --port 8765
+    SCHWAB_API_BASE=http://127.0.0.1:8765 python ../../active/PositionsExporter-Schwab.py
+
+-------------------------------------------------------------------------------
+"""
+
+import argparse, json, math, random, threading, time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+R = 0.045
+
+# --------------------------------------------------------------------------
+# Pricing
+# --------------------------------------------------------------------------
+def _n(x: float) -> float:
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+def bs(S: float, K: float, T: float, v: float, q: float, call: bool) -> Dict[str, float]:
+    T = max(T, 1 / 365)
+    d1 = (math.log(S / K) + (R - q + v * v / 2) * T) / (v * math.sqrt(T))
+    d2 = d1 - v * math.sqrt(T)
+    eq, er, pdf = math.exp(-q * T), math.exp(-R * T), math.exp(-d1 * d1 / 2) / math.sqrt(2 * math.pi)
+    c = S * eq * _n(d1) - K * er * _n(d2)
+    sg = 1 if call else -1
+    return {
+        "mark": c if call else c - S * eq + K * er,
+        "delta": eq * _n(d1) if call else eq * (_n(d1) - 1),
+        "gamma": eq * pdf / (S * v * math.sqrt(T)),
+        "theta": (-S * eq * pdf * v / (2 * math.sqrt(T)) - sg * R * K * er * _n(sg * d2) + sg * q * S * eq * _n(sg * d1)) / 365,
+        "vega": S * eq * pdf * math.sqrt(T) / 100,
+    }
+
+# --------------------------------------------------------------------------
+# Synthetic book
+# --------------------------------------------------------------------------
+class Book:
+    def __init__(self, positions: int = 1000, accounts: int = 2, strikes: int = 40, seed: int = 7):
+        rnd = random.Random(seed)
+        self.today = date.today()
+        self.expiries = [self.today + timedelta(days=d) for d in (7, 14, 35, 63, 91, 182, 364)]
+        n_und = max(5, positions // 20)
+        names = ["BRK.B"] + [f"T{i:03d}" for i in range(n_und - 1)]
+        self.und = {s: {"spot": round(rnd.uniform(20, 600), 2), "iv": rnd.uniform(0.18, 0.65),
+                        "q": rnd.choice((0.0, 0.0, 0.012, 0.025))} for s in names}
+        self.strikes = strikes
+        self.accounts: Dict[str, List[Dict[str, Any]]] = {f"{10000000 + i}": [] for i in range(accounts)}
+        # (underlying, "C"/"P") -> {expiry iso -> set(strike)}
+        self.held: Dict[Tuple[str, str], Dict[str, set]] = {}
+        for i in range(positions):
+            und = rnd.choice(names)
+            u = self.und[und]
+            acct = rnd.choice(list(self.accounts))
+            if rnd.random() < 0.1:
+                qty = rnd.randint(1, 500)
+                self.accounts[acct].append(self._position(rnd, und.replace(".", "/"), "EQUITY", qty, u["spot"], 1))
+                continue
+            exp, cp = rnd.choice(self.expiries), rnd.choice("CP")
+            k = self.strike(u["spot"] * rnd.uniform(0.8, 1.2))
+            self.held.setdefault((und, cp), {}).setdefault(exp.isoformat(), set()).add(k)
+            occ = f"{und.replace('.', ''):<6}{exp:%y%m%d}{cp}{int(round(k * 1000)):08d}"
+            mark = bs(u["spot"], k, (exp - self.today).days / 365, u["iv"], u["q"], cp == "C")["mark"]
+            qty = rnd.choice((-1, 1)) * rnd.randint(1, 20)
+            self.accounts[acct].append(self._position(rnd, occ, "OPTION", qty, mark, 100))
+
+    @staticmethod
+    def strike(x: float) -> float:
+        step = 1 if x < 100 else 5
+        return float(max(step, round(x / step) * step))
+
+    @staticmethod
+    def _position(rnd: random.Random, sym: str, at: str, qty: int, mark: float, mult: int) -> Dict[str, Any]:
+        avg = round(mark * rnd.uniform(0.7, 1.3), 2)
+        mv = round(qty * mark * mult, 2)
+        pl = round(qty * (mark - avg) * mult, 2)
+        return {
+            "longQuantity": max(qty, 0), "shortQuantity": max(-qty, 0), "averagePrice": avg,
+            "marketValue": mv, "maintenanceRequirement": abs(mv) * 0.25, "averageLongPrice": avg if qty > 0 else None,
+            "longOpenProfitLoss": pl if qty > 0 else 0, "shortOpenProfitLoss": pl if qty < 0 else 0,
+            "currentDayProfitLoss": round(mv * 0.01, 2), "currentDayProfitLossPercentage": 1.0,
+            "instrument": {"symbol": sym, "assetType": at, "cusip": "000000000", "description": sym},
+        }
+
+    def root(self, sym: str) -> Optional[str]:
+        s = sym.upper().replace("/", ".").replace("-", ".")
+        return s if s in self.und else None
+
+    def accounts_json(self) -> List[Dict[str, Any]]:
+        return [{"securitiesAccount": {"accountNumber": a, "type": "MARGIN", "positions": p}}
+                for a, p in self.accounts.items()]
+
+    def quote(self, und: str) -> Dict[str, Any]:
+        u = self.und[und]
+        return {
+            "symbol": und,
+            "quote": {"mark": u["spot"], "lastPrice": u["spot"], "closePrice": u["spot"]},
+            "fundamental": {"divYield": round(u["q"] * 100, 2), "divAmount": round(u["spot"] * u["q"], 2),
+                            "divExDate": (self.today + timedelta(days=30)).isoformat() + "T00:00:00Z",
+                            "lastEarningsDate": (self.today - timedelta(days=40)).isoformat() + "T00:00:00Z",
+                            "nextDivExDate": (self.today + timedelta(days=120)).isoformat() + "T00:00:00Z"},
+        }
+
+    def chain(self, und: str, cp: str, e0: str, e1: str, strike: Optional[float]) -> Dict[str, Any]:
+        u = self.und[und]
+        held = self.held.get((und, cp), {})
+        em: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for exp in self.expiries:
+            e = exp.isoformat()
+            if not (e0 <= e <= e1):
+                continue
+            dte = (exp - self.today).days
+            ks = set(held.get(e, ())) | {self.strike(u["spot"] * (0.5 + i / max(1, self.strikes))) for i in range(self.strikes)}
+            if strike is not None:
+                ks = {k for k in ks if abs(k - strike) < 1e-6}
+            em[f"{e}:{dte}"] = {
+                f"{k:.1f}": [self.contract(und, exp, cp, k)] for k in sorted(ks)}
+        return {"symbol": und, "status": "SUCCESS", "underlying": {"mark": u["spot"], "last": u["spot"]},
+                "underlyingPrice": u["spot"], "callExpDateMap" if cp == "C" else "putExpDateMap": em}
+
+    def contract(self, und: str, exp: date, cp: str, k: float) -> Dict[str, Any]:
+        u, dte = self.und[und], (exp - self.today).days
+        g = bs(u["spot"], k, dte / 365, u["iv"], u["q"], cp == "C")
+        intrinsic = max(0.0, (u["spot"] - k) if cp == "C" else (k - u["spot"]))
+        return {
+            "putCall": "CALL" if cp == "C" else "PUT", "mark": round(g["mark"], 2),
+            "delta": round(g["delta"], 4), "gamma": round(g["gamma"], 4), "theta": round(g["theta"], 4),
+            "vega": round(g["vega"], 4), "volatility": round(u["iv"] * 100, 3),
+            "theoreticalVolatility": 29.0, "totalVolume": 100, "openInterest": 1000,
+            "timeValue": round(g["mark"] - intrinsic, 2), "highPrice": round(g["mark"] * 1.05, 2),
+            "lowPrice": round(g["mark"] * 0.95, 2), "closePrice": round(g["mark"], 2),
+            "daysToExpiration": dte, "optionDeliverablesList": [{"deliverableUnits": 100.0}],
+        }
+
+# --------------------------------------------------------------------------
+# Server
+# --------------------------------------------------------------------------
+class FakeSchwab:
+    """Threaded HTTP server over a Book; `counts` tallies requests per endpoint (429s included)."""
+    def __init__(self, book: Book, latency: float = 0.0, p429: float = 0.0, retry_after: str = "1",
+                 host: str = "127.0.0.1", port: int = 0):
+        self.book, self.latency, self.p429, self.retry_after = book, latency, p429, retry_after
+        self.counts: Counter = Counter()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.srv = ThreadingHTTPServer((host, port), self._handler())
+        self.srv.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        h, p = self.srv.server_address[:2]
+        return f"http://{h}:{p}"
+
+    def start(self) -> "FakeSchwab":
+        self.thread = threading.Thread(target=self.srv.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.srv.shutdown()
+        self.srv.server_close()
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.bytes = 0
+
+    def _handler(self):
+        fake = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _send(self, code: int, body: Any = None, headers: Optional[Dict[str, str]] = None):
+                raw = b"" if body is None else json.dumps(body, separators=(",", ":")).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(raw)
+                with fake.lock:
+                    fake.bytes += len(raw)
+
+            def _route(self, method: str):
+                u = urlparse(self.path)
+                q = {k: v[0] for k, v in parse_qs(u.query).items()}
+                path = u.path.rstrip("/")
+                if n := int(self.headers.get("Content-Length") or 0):
+                    self.rfile.read(n)
+                if path == "/_stats":
+                    return self._send(200, {"counts": dict(fake.counts), "bytes": fake.bytes})
+                ep = ("token" if path.endswith("/oauth/token") else "accounts" if path.endswith("/accounts")
+                      else "chains" if path.endswith("/chains") else "quotes" if path.endswith("/marketdata/v1/quotes")
+                      else "symquotes" if path.endswith("/quotes") else "unknown")
+                with fake.lock:
+                    fake.counts[ep] += 1
+                if fake.latency:
+                    time.sleep(fake.latency * random.uniform(0.5, 1.5))
+                if ep != "token" and random.random() < fake.p429:
+                    with fake.lock:
+                        fake.counts["429"] += 1
+                    return self._send(429, {"message": "throttled"}, {"Retry-After": fake.retry_after})
+                b = fake.book
+                if ep == "token" and method == "POST":
+                    return self._send(200, {"access_token": f"fake-{time.time():.0f}", "refresh_token": "fake-refresh",
+                                            "expires_in": 1800, "token_type": "Bearer"})
+                if ep == "accounts":
+                    return self._send(200, b.accounts_json())
+                if ep == "chains":
+                    und = b.root(q.get("symbol", ""))
+                    if not und:
+                        return self._send(200, {"status": "FAILED"})
+                    cp = "C" if q.get("contractType", "CALL") == "CALL" else "P"
+                    k = float(q["strike"]) if q.get("strike") else None
+                    return self._send(200, b.chain(und, cp, q.get("fromDate", "0000"), q.get("toDate", "9999"), k))
+                if ep == "quotes":
+                    syms = [s for s in q.get("symbols", "").split(",") if s]
+                    return self._send(200, {s: b.quote(r) for s in syms if (r := b.root(s))})
+                if ep == "symquotes":
+                    s = path.split("/")[-2]
+                    return self._send(200, {s: b.quote(r)} if (r := b.root(s)) else {})
+                return self._send(404, {"message": "not found"})
+
+            def do_GET(self):
+                self._route("GET")
+
+            def do_POST(self):
+                self._route("POST")
+
+        return H
+
+# --------------------------------------------------------------------------
+# Entry
+# --------------------------------------------------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Local Schwab API stand-in")
+    ap.add_argument("--positions", type=int, default=1000)
+    ap.add_argument("--accounts", type=int, default=2)
+    ap.add_argument("--strikes", type=int, default=40)
+    ap.add_argument("--latency", type=float, default=0.0, help="Seconds added per response (±50%%)")
+    ap.add_argument("--p429", type=float, default=0.0, help="Probability of a 429 per request")
+    ap.add_argument("--port", type=int, default=8765)
+    a = ap.parse_args()
+    fake = FakeSchwab(Book(a.positions, a.accounts, a.strikes), a.latency, a.p429, port=a.port)
+    print(f"🧪 Fake Schwab on {fake.url} — {a.positions} positions; Ctrl+C to stop")
+    try:
+        fake.srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
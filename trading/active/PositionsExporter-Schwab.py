@@ -9,48 +9,106 @@ Purpose:
     and writes the final result into an Excel workbook.
 
 Overall Flow:
-    1. Load configuration and environment variables from `.env`
-    2. Refresh OAuth2 token using saved Schwab credentials
-    3. Retrieve all account positions via the Schwab Trading API
-    4. Write raw position data into Excel (Phase 1)
+    1. Load configuration and environment variables from `.env` (or several
+       credential profiles with `--profiles a.env b.env`)
+    2. Reuse the saved OAuth2 access token while valid, refreshing ahead of expiry
+    3. Retrieve all account positions via the Schwab Trading API, every profile
+       concurrently (or replay a stored snapshot)
+    4. Load raw position data into slotted in-memory records (Phase 1)
     5. Fetch live option chain and quote data from Schwab Market Data API
-    6. Update each position row with computed and fetched metrics (Phase 2)
-    7. Save enriched workbook to disk with runtime progress output and colors
+    6. Update each position row with computed and fetched metrics (Phase 2),
+       with one chain request per underlying and call/put, up to `--workers`
+       of them in flight concurrently; positions unchanged since the last run
+       carry dividend/earnings fields forward for the day, and greeks/prices
+       only for `--carry-secs` (`--full` to re-enrich everything)
+    7. Aggregate net delta / theta / notional per underlying and account
+    8. Stream the enriched rows and the "Exposure" sheet to Excel once, in openpyxl write-only mode
+    With `--watch [SECS]` steps 3–8 repeat on a schedule in one process, and outputs
+    are only rewritten when the enriched data changed
 
 Storage Locations:
     • Token JSON → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\OAuth\\schwab_token.json
+      (first profile uses it; `acct2/.env` → schwab_token-acct2.json alongside, unless it sets SCHWAB_TOKEN_PATH)
     • Excel export → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\positions.xlsx
-    • Raw API dump → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\accounts.json
+    • Raw API snapshots → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\snapshots\\accounts-<stamp>.json.zst|.gz
+      (compact, newest SNAP_KEEP kept; replay with `--from-snapshot [FILE|latest]`)
+    • Market-data cache → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\cache\\marketdata.sqlite
+      (chains 30s, fundamentals 1 day; `--refresh` to re-fetch, `--no-cache` to bypass)
+    • Run report → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\run_report.json
+      (per-endpoint p50/p95/p99, bytes, cache hits, retries, phase times; `--prom FILE` for Prometheus;
+      with `--watch` each tick rewrites it with that tick's numbers only)
+    • Position history → C:\\Users\\mnc35\\evboise-fleet\\_dev\\Working_Files\\history\\{positions,exposure}\\
+      date=…/accountId=…/*.parquet (appended every run with `--parquet`)
 
 Dependencies:
     - requests        : for HTTP API calls
     - openpyxl        : for Excel export
     - dotenv          : for environment variable loading
+    - numpy           : (optional) for local Black-Scholes greeks and the Exposure roll-up
+    - pyarrow         : (optional) for the `--parquet` position history store
+    - zstandard       : (optional) zstd raw snapshots instead of gzip
     - typing, pathlib : for type safety and filesystem paths
 
 -------------------------------------------------------------------------------
 """
 
-import os, json, base64, time, requests
+import os, json, base64, gzip, time, argparse, hashlib, random, sqlite3, threading, zlib, requests
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, cast
-from dotenv import load_dotenv
-from openpyxl import Workbook, load_workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from urllib.parse import urlencode
+from dotenv import dotenv_values, load_dotenv
+from requests.adapters import HTTPAdapter
+from openpyxl import Workbook
+
+try:
+    import numpy as np
+except ImportError:  # optional: only needed for local greeks
+    np = None
+try:
+    import zstandard as zstd
+except ImportError:  # optional: snapshots fall back to gzip
+    zstd = None
+try:
+    import pyarrow as pa, pyarrow.parquet as pq
+except ImportError:  # optional: only needed for --parquet
+    pa = pq = None
 
 # --------------------------------------------------------------------------
 # Initialization
 # --------------------------------------------------------------------------
 load_dotenv()
 
+API = os.getenv("SCHWAB_API_BASE", "https://api.schwabapi.com").rstrip("/")   # override to hit a local stand-in
+
 CONFIG = {
     "TOKEN_PATH": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\OAuth\schwab_token.json"),
-    "TOKEN_URL": "https://api.schwabapi.com/v1/oauth/token",
-    "ACCT_URL": "https://api.schwabapi.com/trader/v1/accounts",
-    "CHAINS_URL": "https://api.schwabapi.com/marketdata/v1/chains",
-    "QUOTES_URL": "https://api.schwabapi.com/marketdata/v1/quotes",
+    "TOKEN_URL": f"{API}/v1/oauth/token",
+    "ACCT_URL": f"{API}/trader/v1/accounts",
+    "CHAINS_URL": f"{API}/marketdata/v1/chains",
+    "QUOTES_URL": f"{API}/marketdata/v1/quotes",
     "XLSX_FILE": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\positions.xlsx"),
-    "RAW_FILE": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\accounts.json"),
+    "SNAP_DIR": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\snapshots"),
+    "SNAP_KEEP": 96,       # newest raw account snapshots kept
+    "PARQUET_DIR": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\history"),
+    "STATE_FILE": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\positions_state.json"),
+    "CARRY_SECS": 30,      # unchanged positions reuse MARKET fields younger than this (≤ chain TTL and --watch;
+                           # SLOW fields: same day); --carry-secs overrides
+    "REPORT_FILE": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\run_report.json"),
+    "CACHE_FILE": Path(r"C:\Users\mnc35\evboise-fleet\_dev\Working_Files\cache\marketdata.sqlite"),
+    # seconds, by "<last URL segment>:<fields>" then "<last URL segment>"; absent = not cached
+    "CACHE_TTL": {"chains": 30, "quotes:fundamental": 86400, "quotes": 15},
+    "CACHE_SIZE": 2048,
+    "TOKEN_MARGIN": 300,   # refresh this many seconds before the access token expires
+    "WORKERS": int(os.getenv("SCHWAB_WORKERS", "8")),
+    "RATE_LIMITS": {"trader": 120, "marketdata": 120},   # requests/minute per budget (Schwab app quota)
+    "MAX_RETRIES": 6,      # for 429 / 5xx / connection errors, with jittered exponential backoff
+    "QUOTE_CHUNK": 100,
+    "RISK_FREE": float(os.getenv("SCHWAB_RISK_FREE", "0.045")),
 }
 MAP = {"BRKB": "BRK.B", "BRKA": "BRK.A"}
 
@@ -60,6 +118,24 @@ MAP = {"BRKB": "BRK.B", "BRKA": "BRK.A"}
 def first(*v):
     return next((x for x in v if x is not None), None)
 
+def num(v) -> Optional[float]:
+    try:
+        return None if v in (None, "") else float(v)
+    except (TypeError, ValueError):
+        return None
+
+def atomic_write(p: Path, text: str):
+    # write-then-rename so a crash or a concurrent reader never sees a half-written file
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, p)
+
+def aliases(sym: str) -> List[str]:
+    """All spellings Schwab may use for a root: quote form (BRK.B), then BRK/B, BRK-B, raw."""
+    s = MAP.get(sym, sym).replace('/', '.').replace('-', '.')
+    return list(dict.fromkeys((s, s.replace('.', '/'), s.replace('.', '-'), sym)))
+
 def parse(sym: str) -> Optional[Tuple[str, str, str, float]]:
     if not isinstance(sym, str) or len(sym) < 21:
         return None
@@ -71,74 +147,460 @@ def parse(sym: str) -> Optional[Tuple[str, str, str, float]]:
     except:
         return None
 
+# --------------------------------------------------------------------------
+# Raw snapshots
+# --------------------------------------------------------------------------
+def _snap_open(p: Path, mode: str, zst: bool):
+    if zst:
+        if zstd is None:
+            raise SystemExit(f"❌ {p.name} is zstd-compressed; pip install zstandard")
+        return zstd.open(p, mode + "t", encoding="utf-8")
+    return gzip.open(p, mode + "t", encoding="utf-8", compresslevel=6)
+
+def save_snapshot(d: Any, root: Optional[Path] = None) -> Path:
+    """Streams the raw accounts payload as compact JSON through zstd (or gzip), then prunes to SNAP_KEEP."""
+    root = root or CONFIG["SNAP_DIR"]
+    root.mkdir(parents=True, exist_ok=True)
+    ts = time.time()
+    p = root / f"accounts-{time.strftime('%Y%m%dT%H%M%S', time.localtime(ts))}{int(ts * 1000) % 1000:03d}.json.{'zst' if zstd else 'gz'}"
+    tmp = p.with_name(f".{p.name}.tmp")
+    with _snap_open(tmp, "w", zstd is not None) as f:
+        for chunk in json.JSONEncoder(separators=(",", ":")).iterencode(d):
+            f.write(chunk)
+    os.replace(tmp, p)
+    for old in sorted(root.glob("accounts-*.json.*"))[:-CONFIG["SNAP_KEEP"]]:
+        old.unlink(missing_ok=True)
+    return p
+
+def load_snapshot(spec: str, root: Optional[Path] = None) -> Any:
+    p = Path(spec)
+    if spec == "latest":
+        snaps = sorted((root or CONFIG["SNAP_DIR"]).glob("accounts-*.json.*"))
+        if not snaps:
+            raise SystemExit(f"❌ No snapshots in {root or CONFIG['SNAP_DIR']}")
+        p = snaps[-1]
+    if p.suffix == ".json":
+        return json.loads(p.read_text())
+    with _snap_open(p, "r", p.suffix == ".zst") as f:
+        return json.load(f)
+
+# --------------------------------------------------------------------------
+# Instrumentation
+# --------------------------------------------------------------------------
+def endpoint(u: str) -> str:
+    return u.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+
+class Metrics:
+    """Per-endpoint latency / bytes / cache hits / retries plus wall time per phase. Thread-safe."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.t0 = time.time()
+            self.lat: Dict[str, List[float]] = {}
+            self.bytes, self.hits, self.retries, self.errors = Counter(), Counter(), Counter(), Counter()
+            self.spans: Counter = Counter()
+
+    def request(self, ep: str, secs: float, nbytes: int, ok: bool):
+        with self.lock:
+            self.lat.setdefault(ep, []).append(secs)
+            self.bytes[ep] += nbytes
+            self.errors[ep] += not ok
+
+    def count(self, c: Counter, ep: str):
+        with self.lock:
+            c[ep] += 1
+
+    @contextmanager
+    def span(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.spans[name] += time.perf_counter() - t
+
+    @staticmethod
+    def pct(xs: List[float], q: float) -> float:
+        return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            eps = {}
+            for ep in sorted(set(self.lat) | set(self.hits)):
+                xs = sorted(self.lat.get(ep, []))
+                eps[ep] = {"calls": len(xs), "p50_ms": round(self.pct(xs, .50) * 1000, 1),
+                           "p95_ms": round(self.pct(xs, .95) * 1000, 1), "p99_ms": round(self.pct(xs, .99) * 1000, 1),
+                           "total_s": round(sum(xs), 3), "bytes": self.bytes[ep], "cache_hits": self.hits[ep],
+                           "retries": self.retries[ep], "errors": self.errors[ep]}
+            return {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.t0)),
+                    "wall_s": round(time.time() - self.t0, 3),
+                    "phases_s": {k: round(v, 3) for k, v in self.spans.items()}, "endpoints": eps}
+
+    def prometheus(self) -> str:
+        r, out = self.report(), []
+
+        def metric(name: str, kind: str, doc: str, samples: List[Tuple[str, str, Any]]):
+            out.extend([f"# HELP schwab_exporter_{name} {doc}", f"# TYPE schwab_exporter_{name} {kind}"])
+            out.extend(f"schwab_exporter_{name}{sfx}{{{lbl}}} {v}" for sfx, lbl, v in samples)
+
+        eps = r["endpoints"].items()
+        metric("request_seconds", "summary", "HTTP latency by endpoint",
+               [("", f'endpoint="{e}",quantile="{q}"', round(v[f"p{int(q * 100)}_ms"] / 1000, 6)) for e, v in eps for q in (.5, .95, .99)]
+               + [("_sum", f'endpoint="{e}"', v["total_s"]) for e, v in eps]
+               + [("_count", f'endpoint="{e}"', v["calls"]) for e, v in eps])
+        for name, key, doc in (("response_bytes_total", "bytes", "Response bytes by endpoint"),
+                               ("cache_hits_total", "cache_hits", "Cache hits by endpoint"),
+                               ("retries_total", "retries", "Retried requests by endpoint")):
+            metric(name, "counter", doc, [("", f'endpoint="{e}"', v[key]) for e, v in eps])
+        metric("phase_seconds", "gauge", "Wall time per phase", [("", f'phase="{k}"', v) for k, v in r["phases_s"].items()])
+        return "\n".join(out) + "\n"
+
+    def write(self, p: Optional[Path] = None, prom: Optional[Path] = None):
+        atomic_write(p or CONFIG["REPORT_FILE"], json.dumps(self.report(), indent=2))
+        if prom:
+            atomic_write(prom, self.prometheus())
+
+METRICS = Metrics()
+
+# --------------------------------------------------------------------------
+# HTTP
+# --------------------------------------------------------------------------
+class Bucket:
+    """Token bucket refilled at `per_min`/60 per second; a 429 can pause the whole budget."""
+    def __init__(self, per_min: float, burst: Optional[float] = None):
+        self.rate, self.cap = per_min / 60, burst or max(1.0, per_min / 12)
+        self.tokens, self.t, self.hold = self.cap, time.monotonic(), 0.0
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+                self.t = now
+                wait = self.hold - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, secs: float):
+        with self.lock:
+            self.hold = max(self.hold, time.monotonic() + secs)
+
+class Client:
+    """
+    One keep-alive session shared by auth, trader and market-data calls (and all workers). Every call
+    goes through the governor: a token bucket per budget, Retry-After on 429, jittered backoff otherwise.
+    """
+    RETRY = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool: int = CONFIG["WORKERS"]):
+        self.s = requests.Session()
+        # pool_block: extra workers wait for a pooled socket instead of opening throwaway ones
+        a = HTTPAdapter(pool_connections=2, pool_maxsize=max(1, pool), pool_block=True)
+        self.s.mount("https://", a)
+        self.s.mount("http://", a)
+        self.s.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+        self.buckets = {k: Bucket(v) for k, v in CONFIG["RATE_LIMITS"].items()}
+        self.retries, self.lock = 0, threading.Lock()
+
+    def bearer(self, t: str):
+        self.s.headers["Authorization"] = f"Bearer {t}"
+
+    def budget(self, u: str) -> Optional[Bucket]:
+        return next((b for k, b in self.buckets.items() if f"/{k}/" in u), None)
+
+    @staticmethod
+    def retry_after(r: requests.Response) -> Optional[float]:
+        v = r.headers.get("Retry-After")
+        if not v:
+            return None
+        try:
+            return max(0.0, float(v))
+        except ValueError:
+            pass
+        try:
+            d = parsedate_to_datetime(v)   # HTTP-date form
+            return max(0.0, (d - datetime.now(d.tzinfo)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, method: str, u: str, **kw) -> requests.Response:
+        b, ep = self.budget(u), endpoint(u)
+        for n in range(CONFIG["MAX_RETRIES"] + 1):
+            if b:
+                b.take()
+            delay = min(30.0, 0.5 * 2 ** n) * random.uniform(0.5, 1.5)
+            t = time.perf_counter()
+            try:
+                r = self.s.request(method, u, timeout=30, **kw)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.request(ep, time.perf_counter() - t, 0, False)
+                if n == CONFIG["MAX_RETRIES"]:
+                    raise
+            else:
+                METRICS.request(ep, time.perf_counter() - t, int(r.headers.get("Content-Length") or len(r.content)), r.ok)
+                if r.status_code not in self.RETRY or n == CONFIG["MAX_RETRIES"]:
+                    return r
+                if (ra := self.retry_after(r)) is not None:
+                    delay = ra + random.uniform(0, 0.5)
+                if r.status_code == 429 and b:
+                    b.pause(delay)   # every worker on this budget backs off, not just this one
+            with self.lock:
+                self.retries += 1
+            METRICS.count(METRICS.retries, ep)
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def get(self, u: str, **kw) -> requests.Response:
+        return self.request("GET", u, **kw)
+
+    def post(self, u: str, **kw) -> requests.Response:
+        return self.request("POST", u, **kw)
+
+    def stats(self) -> Tuple[int, int]:
+        """(requests sent, TCP/TLS connections opened) across every pooled host."""
+        n = c = 0
+        for a in {id(a): a for a in self.s.adapters.values()}.values():
+            pools = cast(HTTPAdapter, a).poolmanager.pools
+            for k in pools.keys():
+                n, c = n + pools[k].num_requests, c + pools[k].num_connections
+        return n, c
+
+# --------------------------------------------------------------------------
+# Cache
+# --------------------------------------------------------------------------
+class Cache:
+    """URL+params response cache: LRU memory tier over a zlib-compressed sqlite tier."""
+    def __init__(self, path: Optional[Path] = None, size: int = CONFIG["CACHE_SIZE"], read: bool = True):
+        self.mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.size, self.read, self.lock = size, read, threading.Lock()
+        self.hits = self.misses = 0
+        self.db = None
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path), check_same_thread=False)
+            self.db.execute("PRAGMA synchronous=OFF")
+            self.db.execute("CREATE TABLE IF NOT EXISTS c (k TEXT PRIMARY KEY, exp REAL, v BLOB)")
+            self.db.execute("DELETE FROM c WHERE exp < ?", (time.time(),))
+            self.db.commit()
+
+    @staticmethod
+    def key(u: str, p: Dict[str, Any]) -> str:
+        return f"{u}?{urlencode(sorted(p.items()))}"
+
+    def _remember(self, k: str, exp: float, v: Any):
+        self.mem[k] = (exp, v)
+        self.mem.move_to_end(k)
+        while len(self.mem) > self.size:
+            self.mem.popitem(last=False)
+
+    def get(self, k: str) -> Any:
+        now = time.time()
+        with self.lock:
+            if self.read:
+                if (e := self.mem.get(k)) and e[0] > now:
+                    self.mem.move_to_end(k)
+                    self.hits += 1
+                    return e[1]
+                row = self.db.execute("SELECT exp, v FROM c WHERE k = ?", (k,)).fetchone() if self.db else None
+                if row and row[0] > now:
+                    v = json.loads(zlib.decompress(row[1]))
+                    self._remember(k, row[0], v)
+                    self.hits += 1
+                    return v
+            self.misses += 1
+        return None
+
+    def put(self, k: str, v: Any, ttl: float):
+        exp = time.time() + ttl
+        with self.lock:
+            self._remember(k, exp, v)
+            if self.db:
+                blob = zlib.compress(json.dumps(v, separators=(",", ":")).encode())
+                self.db.execute("INSERT OR REPLACE INTO c VALUES (?, ?, ?)", (k, exp, blob))
+                self.db.commit()
+
 # --------------------------------------------------------------------------
 # OAuth
 # --------------------------------------------------------------------------
 class SchwabAuth:
-    def __init__(self):
-        self.cid, self.csec, self.redirect = [os.getenv(k) for k in
+    """
+    Expiry-aware token manager: reuses a still-valid access token, refreshes under a lock so
+    concurrent callers never stampede TOKEN_URL, and re-arms a background refresh ahead of expiry.
+    """
+    def __init__(self, c: Client, env: Optional[Dict[str, Optional[str]]] = None, name: str = "default",
+                 primary: bool = True):
+        # primary: this login's bearer becomes the shared client's default (market data); others send their own
+        self.c, self.name, self.primary = c, name, primary
+        env = env if env is not None else dict(os.environ)
+        self.cid, self.csec, self.redirect = [env.get(k) for k in
             ("SCHWAB_CLIENT_ID", "SCHWAB_CLIENT_SECRET", "SCHWAB_REDIRECT_URI")]
         if not all((self.cid, self.csec, self.redirect)):
-            raise SystemExit("❌ Missing .env credentials")
+            raise SystemExit(f"❌ Missing .env credentials ({name})")
+        self.path = Path(env["SCHWAB_TOKEN_PATH"]) if env.get("SCHWAB_TOKEN_PATH") else None
+        self.lock = threading.Lock()
+        self.tok: Dict[str, Any] = {}
+        self.timer: Optional[threading.Timer] = None
+
+    @property
+    def token_path(self) -> Path:
+        # the first (or only) profile keeps the existing schwab_token.json
+        return self.path or (CONFIG["TOKEN_PATH"] if self.primary
+                             else CONFIG["TOKEN_PATH"].with_name(f"schwab_token-{self.name}.json"))
+
+    def header(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token()}"}
+
+    def _fresh(self) -> bool:
+        return bool(self.tok.get("access_token")) and self.tok.get("expires_at", 0) - CONFIG["TOKEN_MARGIN"] > time.time()
+
+    def token(self) -> str:
+        with self.lock:
+            if not self.tok:
+                p = self.token_path
+                self.tok = json.loads(p.read_text()) if p.exists() else {}
+            if not self._fresh():
+                return self._refresh()
+            if self.primary:
+                self.c.bearer(self.tok["access_token"])
+            self._arm()
+            return self.tok["access_token"]
 
     def refresh(self) -> str:
-        p = CONFIG["TOKEN_PATH"]
-        t = json.loads(p.read_text()) if p.exists() else {}
+        with self.lock:
+            return self._refresh()
+
+    def _refresh(self) -> str:
+        p = self.token_path
+        t = self.tok or (json.loads(p.read_text()) if p.exists() else {})
         h = {
             "Authorization": "Basic " + base64.b64encode(f"{self.cid}:{self.csec}".encode()).decode(),
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        r = requests.post(CONFIG["TOKEN_URL"],
+        r = self.c.post(CONFIG["TOKEN_URL"],
             data={"grant_type": "refresh_token", "refresh_token": t.get("refresh_token"), "redirect_uri": self.redirect},
-            headers=h, timeout=30)
+            headers=h)
         r.raise_for_status()
         j = r.json()
-        p.write_text(json.dumps(j, indent=2))
+        j.setdefault("refresh_token", t.get("refresh_token"))
+        j["expires_at"] = time.time() + int(j.get("expires_in") or 1800)
+        atomic_write(p, json.dumps(j, indent=2))
+        self.tok = j
+        if self.primary:
+            self.c.bearer(j["access_token"])
+        self._arm()
         return j["access_token"]
 
+    def _arm(self, delay: Optional[float] = None):
+        if self.timer:
+            self.timer.cancel()
+        delay = delay if delay is not None else max(5.0, self.tok.get("expires_at", 0) - CONFIG["TOKEN_MARGIN"] - time.time())
+        self.timer = threading.Timer(delay, self._background)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _background(self):
+        try:
+            self.refresh()
+        except requests.RequestException as ex:
+            print(f"⚠️ Background token refresh failed for {self.name} ({ex}); retrying in 30s")
+            self._arm(30)
+
+    def close(self):
+        if self.timer:
+            self.timer.cancel()
+
 # --------------------------------------------------------------------------
 # Market Data
 # --------------------------------------------------------------------------
 class OptionFetcher:
-    def __init__(self, t: str):
-        self.t = t
+    def __init__(self, c: Client, cache: Optional[Cache] = None):
+        self.c, self.cache = c, cache
 
     def get(self, u: str, p: Dict[str, Any]) -> Dict[str, Any]:
-        r = requests.get(u, headers={"Authorization": f"Bearer {self.t}"}, params=p, timeout=30)
-        return r.json() if r.ok else {}
+        seg, ttls = u.rstrip("/").rsplit("/", 1)[-1], CONFIG["CACHE_TTL"]
+        ttl = ttls.get(f"{seg}:{p.get('fields')}", ttls.get(seg, 0)) if self.cache else 0
+        if ttl and (v := cast(Cache, self.cache).get(k := Cache.key(u, p))) is not None:
+            METRICS.count(METRICS.hits, seg)
+            return v
+        r = self.c.get(u, params=p)
+        if r.status_code in Client.RETRY:
+            r.raise_for_status()   # throttled past MAX_RETRIES: surface it, don't pass it off as "not found"
+        j = r.json() if r.ok else {}
+        if ttl and j:
+            cast(Cache, self.cache).put(k, j, ttl)
+        return j
 
-    def chain(self, s, e, cp, k):
+    def chain(self, s, cp, e0, e1=None, k=None):
         p = {
             "symbol": s,
             "contractType": "CALL" if cp == "C" else "PUT",
             "strategy": "SINGLE",
-            "strike": str(int(k)) if float(k).is_integer() else f"{k:.2f}",
-            "fromDate": e,
-            "toDate": e,
+            "fromDate": e0,
+            "toDate": e1 or e0,
             "includeQuotes": "TRUE"
         }
-        for alt in (s, {"BRK.B": "BRK/B", "BRKB": "BRK-B"}.get(s)):
-            if not alt:
-                continue
+        if k is not None:
+            p["strike"] = str(int(k)) if float(k).is_integer() else f"{k:.2f}"
+        for alt in aliases(s)[:2]:
             p["symbol"] = alt
             j = self.get(CONFIG["CHAINS_URL"], p)
             if j:
                 return j
         return {}
 
-    def extract(self, j: Dict[str, Any], cp, e, k, fdata=None) -> Dict[str, Any]:
-        em = j.get("callExpDateMap" if cp == "C" else "putExpDateMap", {})
-        if not em:
-            return {}
-        ex = next((x for x in em if x.split(":")[0] == e), None)
-        if not ex or not em[ex]:
-            return {}
-        sk = next((x for x in em[ex] if abs(float(x) - k) < 1e-6), None)
-        if not sk:
+    def quotes(self, syms, fields: str = "fundamental") -> Dict[str, Dict[str, Any]]:
+        """Multi-symbol /quotes in QUOTE_CHUNK batches, keyed back to the roots passed in.
+        A failed chunk is skipped with a warning; its roots are simply absent from the result."""
+        back = {a.upper(): s for s in syms for a in aliases(s)}
+        qs, out = sorted({aliases(s)[0] for s in syms}), {}
+        for i in range(0, len(qs), CONFIG["QUOTE_CHUNK"]):
+            chunk = qs[i:i + CONFIG["QUOTE_CHUNK"]]
+            try:
+                data = self.get(CONFIG["QUOTES_URL"], {"symbols": ",".join(chunk), "fields": fields})
+            except requests.RequestException as ex:
+                print(f"⚠️ Quotes unavailable for {chunk[0]}..{chunk[-1]} ({len(chunk)} symbols): {ex}")
+                continue
+            base = data.get("quotes") if isinstance(data.get("quotes"), dict) else data
+            for k, q in base.items():
+                if isinstance(q, dict) and (root := back.get(str(k).upper())):
+                    out.setdefault(root, q)
+        return out
+
+    @staticmethod
+    def index(j: Dict[str, Any], cp) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """Flattens a chain's exp-date map into {(expiry, strike in thousandths): contract}."""
+        ix = {}
+        for ex, strikes in (j.get("callExpDateMap" if cp == "C" else "putExpDateMap") or {}).items():
+            e = ex.split(":")[0]
+            for sk, contracts in (strikes or {}).items():
+                if contracts:
+                    ix[(e, round(float(sk) * 1000))] = contracts[0]
+        return ix
+
+    @staticmethod
+    def fund(fdata=None) -> Dict[str, Any]:
+        fdata = fdata or {}
+        return {
+            "DivYield": fdata.get("divYield") or 0,
+            "DivAmount": fdata.get("divAmount") or 0,
+            "DivExDate": fdata.get("divExDate") or None,
+            "LastEarningsDate": fdata.get("lastEarningsDate") or None,
+            "NextDivExDate": fdata.get("nextDivExDate") or None,
+        }
+
+    def extract(self, j: Dict[str, Any], cp, e, k, fdata=None, ix=None) -> Dict[str, Any]:
+        eobj = (ix if ix is not None else self.index(j, cp)).get((e, round(k * 1000)))
+        if not eobj:
             return {}
-        eobj = em[ex][sk][0]
         base = {f: eobj.get(f) for f in (
-            "delta","theta","volatility","totalVolume","openInterest","timeValue",
+            "delta","theta","gamma","vega","volatility","totalVolume","openInterest","timeValue",
             "highPrice","lowPrice","closePrice","theoreticalVolatility","daysToExpiration")}
         u = first(*[(j.get("underlying", {}) or {}).get(x) for x in ("mark","last","close","price")]) or j.get("underlyingPrice") or 0
         d = eobj.get("optionDeliverablesList")
@@ -147,34 +609,98 @@ class OptionFetcher:
             **base,
             "deliverableUnits": du,
             "UnderlyingPrice": u,
-            "DivYield": (fdata or {}).get("divYield") or 0,
-            "DivAmount": (fdata or {}).get("divAmount") or 0,
-            "DivExDate": (fdata or {}).get("divExDate") or None,
-            "LastEarningsDate": (fdata or {}).get("lastEarningsDate") or None,
-            "NextDivExDate": (fdata or {}).get("nextDivExDate") or None,
-            "DTE": eobj.get("daysToExpiration") or 0
+            **self.fund(fdata),
+            "DTE": eobj.get("daysToExpiration") or 0,
+            "GreeksSource": "chain"
         }
 
 # --------------------------------------------------------------------------
-# Excel Export
+# Local Greeks
 # --------------------------------------------------------------------------
+def _ncdf(x):
+    # Abramowitz & Stegun 7.1.26 erf (|err| < 1.5e-7) — keeps numpy the only dependency
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    erf = 1 - t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429)))) * np.exp(-z * z)
+    return 0.5 * (1 + np.sign(x) * erf)
+
+def _bs(S, K, T, r, q, v, call):
+    d1 = (np.log(S / K) + (r - q + v * v / 2) * T) / (v * np.sqrt(T))
+    d2 = d1 - v * np.sqrt(T)
+    c = S * np.exp(-q * T) * _ncdf(d1) - K * np.exp(-r * T) * _ncdf(d2)
+    return np.where(call, c, c - S * np.exp(-q * T) + K * np.exp(-r * T)), d1, d2
+
+def greeks(S, K, T, q, px, call, r: float = CONFIG["RISK_FREE"]) -> Dict[str, Any]:
+    """
+    Batched Black-Scholes-Merton over equal-length arrays (T in years, q decimal yield, px per-share mark).
+    IV is solved by vectorized bisection; outputs use chain units — volatility in %, theta per day,
+    vega per vol point. Rows with no IV inside [0.1%, 500%] come back NaN.
+    """
+    S, K, T, q, px = (np.asarray(a, dtype=float) for a in (S, K, T, q, px))
+    call = np.asarray(call, dtype=bool)
+    lo, hi = np.full_like(S, 1e-3), np.full_like(S, 5.0)
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        above = _bs(S, K, T, r, q, mid, call)[0] > px
+        hi, lo = np.where(above, mid, hi), np.where(above, lo, mid)
+    v = (lo + hi) / 2
+    p, d1, d2 = _bs(S, K, T, r, q, v, call)
+    v = np.where(np.abs(p - px) < np.maximum(1e-3, px * 1e-3), v, np.nan)
+    pdf, eq, er = np.exp(-d1 * d1 / 2) / np.sqrt(2 * np.pi), np.exp(-q * T), np.exp(-r * T)
+    sign = np.where(call, 1.0, -1.0)
+    theta = (-S * eq * pdf * v / (2 * np.sqrt(T))
+             - sign * r * K * er * _ncdf(sign * d2) + sign * q * S * eq * _ncdf(sign * d1)) / 365
+    return {
+        "volatility": v * 100,
+        "delta": np.where(call, eq * _ncdf(d1), eq * (_ncdf(d1) - 1)),
+        "gamma": eq * pdf / (S * v * np.sqrt(T)),
+        "theta": theta,
+        "vega": S * eq * pdf * np.sqrt(T) / 100,
+    }
+
+# --------------------------------------------------------------------------
+# Positions / Excel Export
+# --------------------------------------------------------------------------
+HDRS = ["accountId","symbol","cusip","description","assetType","longQuantity","shortQuantity","netQuantity",
+        "averagePrice","marketValue","maintenanceRequirement","averageLongPrice","longOpenProfitLoss",
+        "shortOpenProfitLoss","netOpenProfitLoss","costBasis","currentDayProfitLoss","currentDayProfitLossPct",
+        "delta","theta","gamma","vega","volatility","totalVolume","openInterest","timeValue","highPrice","lowPrice",
+        "closePrice","deliverableUnits","theoreticalVolatility","UnderlyingPrice","DivYield","DivAmount","DivExDate",
+        "LastEarningsDate","NextDivExDate","DTE","GreeksSource"]
+SLOW = ("deliverableUnits","DivYield","DivAmount","DivExDate","LastEarningsDate","NextDivExDate")
+MARKET = ("delta","theta","gamma","vega","volatility","totalVolume","openInterest","timeValue","highPrice","lowPrice",
+          "closePrice","theoreticalVolatility","UnderlyingPrice","DTE","GreeksSource")
+EXPO_HDRS = ["accountId","underlying","positions","netDeltaShares","netTheta","deltaNotional","grossNotional",
+             "UnderlyingPrice"]
+TEXT = {"accountId","underlying","symbol","cusip","description","assetType","DivExDate","LastEarningsDate","NextDivExDate",
+        "GreeksSource"}
+
+class Position:
+    """One output row, slotted so a large book stays compact between phases."""
+    __slots__ = tuple(HDRS)
+
+    def __init__(self, **kw):
+        for h in HDRS:
+            setattr(self, h, kw.get(h))
+
+    def row(self) -> List[Any]:
+        return [getattr(self, h) for h in HDRS]
+
+    def key(self) -> str:
+        return f"{self.accountId}|{self.symbol}"
+
+    def fp(self) -> List[Any]:
+        return [self.longQuantity, self.shortQuantity, self.averagePrice]
+
 class Exporter:
-    HDRS = ["accountId","symbol","cusip","description","assetType","longQuantity","shortQuantity","netQuantity",
-            "averagePrice","marketValue","maintenanceRequirement","averageLongPrice","longOpenProfitLoss",
-            "shortOpenProfitLoss","netOpenProfitLoss","costBasis","currentDayProfitLoss","currentDayProfitLossPct",
-            "delta","theta","volatility","totalVolume","openInterest","timeValue","highPrice","lowPrice","closePrice",
-            "deliverableUnits","theoreticalVolatility","UnderlyingPrice","DivYield","DivAmount","DivExDate",
-            "LastEarningsDate","NextDivExDate","DTE"]
-
-    def phase1(self, a: List[Dict[str, Any]]):
-        wb = Workbook()
-        ws = wb.active
-        if ws is None:
-            raise RuntimeError("Workbook.active returned None")
-        ws = cast(Worksheet, ws)
-        ws.title = "Positions"
-        ws.append(self.HDRS)
+    HDRS = HDRS
+
+    def __init__(self):
+        # key -> (epoch, date) the row's MARKET / SLOW fields were last fetched, for rows carried by carry()
+        self.asof: Dict[str, Tuple[float, str]] = {}
 
+    def phase1(self, a: List[Dict[str, Any]]) -> List[Position]:
+        rows: List[Position] = []
         for x in a:
             s = x.get("securitiesAccount", {})
             if not isinstance(s, dict):
@@ -184,98 +710,386 @@ class Exporter:
                 i = p.get("instrument", {})
                 at = i.get("assetType")
                 lq, sq, avg = [float(p.get(k) or 0) for k in ("longQuantity", "shortQuantity", "averagePrice")]
-                cb = (lq + sq) * avg * (100 if at == "OPTION" else 1)
-                ws.append([
-                    aid, i.get("symbol"), i.get("cusip"), i.get("description"), at, lq, sq, lq - sq, avg,
-                    p.get("marketValue"), p.get("maintenanceRequirement"), p.get("averageLongPrice"),
-                    p.get("longOpenProfitLoss") or 0, p.get("shortOpenProfitLoss") or 0,
-                    (p.get("longOpenProfitLoss") or 0) + (p.get("shortOpenProfitLoss") or 0),
-                    cb, p.get("currentDayProfitLoss"), p.get("currentDayProfitLossPercentage")
-                ] + [None] * 19)
-        wb.save(CONFIG["XLSX_FILE"])
-        print("📂 Phase1 complete")
-
-    def phase2(self, t: str):
-        wb = load_workbook(CONFIG["XLSX_FILE"])
-        ws = wb.active
-        if ws is None:
-            raise RuntimeError("Workbook.active returned None")
-        ws = cast(Worksheet, ws)
-
-        hdr = {c.value: i + 1 for i, c in enumerate(ws[1]) if c.value}
-        rows = [r for r in range(2, ws.max_row + 1) if ws.cell(r, hdr["assetType"]).value == "OPTION"]
-        f, u = set(), OptionFetcher(t)
-
-        for r in rows:
-            s = ws.cell(r, hdr["symbol"]).value
-            if isinstance(s, str) and (p := parse(s)):
-                f.add(p[0])
-
-        # --- FIXED SECTION: Retrieve fundamental fields per symbol ---
-        def _symbol_for_quotes(sym: str) -> str:
-            sym = MAP.get(sym, sym)
-            sym = sym.replace('/', '.').replace('-', '.')
-            return sym
-
-        fundamentals: Dict[str, Dict[str, Any]] = {}
-        for sym in f:
-            path_sym = _symbol_for_quotes(sym)
-            url = f"https://api.schwabapi.com/marketdata/v1/{path_sym}/quotes"
-            data = u.get(url, {"fields": "fundamental"})
-            if not isinstance(data, dict):
-                continue
-            base_obj = data.get("quotes") if isinstance(data.get("quotes"), dict) else data
-            if isinstance(base_obj, dict):
-                keys_to_try = [sym, sym.upper(), path_sym, path_sym.upper(), sym.replace('/', '.'), sym.replace('-', '.')]
-                for k in keys_to_try:
-                    q = base_obj.get(k)
-                    if isinstance(q, dict):
-                        fnd = q.get("fundamental") or {}
-                        fundamentals[sym] = {
-                            "divYield": first(fnd.get("divYield"), fnd.get("dividendYield")),
-                            "divAmount": fnd.get("divAmount"),
-                            "divExDate": fnd.get("divExDate"),
-                            "lastEarningsDate": fnd.get("lastEarningsDate"),
-                            "nextDivExDate": fnd.get("nextDivExDate")
-                        }
-                        break
+                lpl, spl = p.get("longOpenProfitLoss") or 0, p.get("shortOpenProfitLoss") or 0
+                rows.append(Position(
+                    accountId=aid, symbol=i.get("symbol"), cusip=i.get("cusip"), description=i.get("description"),
+                    assetType=at, longQuantity=lq, shortQuantity=sq, netQuantity=lq - sq, averagePrice=avg,
+                    marketValue=p.get("marketValue"), maintenanceRequirement=p.get("maintenanceRequirement"),
+                    averageLongPrice=p.get("averageLongPrice"), longOpenProfitLoss=lpl, shortOpenProfitLoss=spl,
+                    netOpenProfitLoss=lpl + spl, costBasis=(lq + sq) * avg * (100 if at == "OPTION" else 1),
+                    currentDayProfitLoss=p.get("currentDayProfitLoss"),
+                    currentDayProfitLossPct=p.get("currentDayProfitLossPercentage")))
+        print(f"📂 Phase1 complete: {len(rows)} positions")
+        return rows
+
+    def phase2(self, rows: List[Position], c: Client, workers: int = CONFIG["WORKERS"], cache: Optional[Cache] = None,
+               local: bool = False, prev: Optional[Dict[str, Any]] = None):
+        opts = [x for x in rows if x.assetType == "OPTION"]
+        u = OptionFetcher(c, cache)
+        jobs = [(x, p) for x in opts if (p := parse(x.symbol))]
+        todo, fundamentals = self.carry(jobs, prev or {})
+
+        # Roots whose quote chunk failed keep blank dividend/earnings fields
+        quotes = u.quotes({p[0] for _, p in todo} - fundamentals.keys())
+        for sym, q in quotes.items():
+            fnd = q.get("fundamental") or {}
+            fundamentals[sym] = {
+                "divYield": first(fnd.get("divYield"), fnd.get("dividendYield")),
+                "divAmount": fnd.get("divAmount"),
+                "divExDate": fnd.get("divExDate"),
+                "lastEarningsDate": fnd.get("lastEarningsDate"),
+                "nextDivExDate": fnd.get("nextDivExDate")
+            }
 
         ok, fail, start = 0, [], time.time()
         GREEN, RED, RESET = "\033[92m", "\033[91m", "\033[0m"
 
-        for i, r in enumerate(rows, 1):
-            s = ws.cell(r, hdr["symbol"]).value
-            if not isinstance(s, str) or not (p := parse(s)):
+        # One chain per (underlying, call/put) spanning every held expiry, no strike filter
+        groups: Dict[Tuple[str, str], List[Tuple[Position, Tuple[str, str, str, float]]]] = {}
+        for job in ([] if local else todo):
+            groups.setdefault((job[1][0], job[1][2]), []).append(job)
+
+        def enrich(key: Tuple[str, str]) -> List[Dict[str, Any]]:
+            (u_, cp), g = key, groups[key]
+            exps = [p[1] for _, p in g]
+            try:
+                j = u.chain(u_, cp, min(exps), max(exps))
+            except requests.RequestException:
+                j = {}
+            ix = u.index(j, cp)
+            return [u.extract(j, cp, e, k, fundamentals.get(u_), ix) for _, (_, e, _, k) in g]
+
+        # pool.map keeps at most `workers` chains in flight and yields in group order
+        i = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for key, res in zip(groups, pool.map(enrich, groups)):
+                for (x, (u_, e, cp, k)), d in zip(groups[key], res):
+                    i += 1
+                    print(f"[{i:>3}/{len(todo)}] {u_:<8} {e} {cp} {k:<7.2f} ⏱ {time.time()-start:6.1f}s ... ", end="", flush=True)
+                    if d:
+                        [setattr(x, k2, v) for k2, v in d.items() if k2 in HDRS]
+                        ok += 1
+                        print(f"{GREEN}✅ updated{RESET}")
+                    else:
+                        fail.append(x.symbol)
+                        print(f"{RED}❌ failed{RESET}")
+        print(f"🔗 {len(groups)} chain requests for {len(todo)} contracts")
+        if local or np is not None:
+            self.local_greeks(jobs, u, fundamentals)
+        print(f"\n📊 Done: {GREEN}{ok} updated{RESET}, {RED}{len(fail)} failed{RESET}")
+        print(f"⏳ Total elapsed: {time.time()-start:.1f}s")
+
+    def carry(self, jobs: List[Tuple[Position, Tuple[str, str, str, float]]],
+              prev: Dict[str, Any]) -> Tuple[List[Tuple[Position, Tuple[str, str, str, float]]], Dict[str, Dict[str, Any]]]:
+        """
+        Copies forward fields for positions whose (long, short, avg price) match the previous snapshot:
+        SLOW fields if they were fetched today, MARKET fields too if younger than CARRY_SECS. Returns
+        the jobs that still need a chain and the fundamentals recovered from carried rows.
+        """
+        today, now = time.strftime("%Y-%m-%d"), time.time()
+        todo, fund = [], {}
+        for x, p in jobs:
+            old = prev.get("rows", {}).get(x.key())
+            if not old or old["fp"] != x.fp() or old["day"] != today:
+                todo.append((x, p))
+                continue
+            v = old["v"]
+            for h in SLOW:
+                setattr(x, h, v.get(h))
+            fund.setdefault(p[0], {"divYield": v.get("DivYield"), "divAmount": v.get("DivAmount"),
+                                   "divExDate": v.get("DivExDate"), "lastEarningsDate": v.get("LastEarningsDate"),
+                                   "nextDivExDate": v.get("NextDivExDate")})
+            if now - old["ts"] < CONFIG["CARRY_SECS"] and v.get("GreeksSource"):
+                for h in MARKET:
+                    setattr(x, h, v.get(h))
+                self.asof[x.key()] = (old["ts"], old["day"])
+            else:
+                todo.append((x, p))
+        print(f"♻️ Carried forward {len(jobs) - len(todo)} unchanged rows; {len(todo)} to fetch")
+        return todo, fund
+
+    @staticmethod
+    def load_state(p: Optional[Path] = None) -> Dict[str, Any]:
+        p = p or CONFIG["STATE_FILE"]
+        try:
+            return json.loads(p.read_text()) if p.exists() else {}
+        except ValueError:
+            return {}
+
+    def save_state(self, rows: List[Position], p: Optional[Path] = None):
+        """Snapshot of every enriched option row for the next run's carry(); carried rows keep their original age."""
+        p = p or CONFIG["STATE_FILE"]
+        now = (time.time(), time.strftime("%Y-%m-%d"))
+        keep = {}
+        for x in rows:
+            if x.assetType == "OPTION" and x.GreeksSource:
+                ts, day = self.asof.get(x.key(), now)
+                keep[x.key()] = {"fp": x.fp(), "ts": ts, "day": day, "v": {h: getattr(x, h) for h in SLOW + MARKET}}
+        atomic_write(p, json.dumps({"rows": keep}, separators=(",", ":"), default=str))
+
+    def local_greeks(self, jobs: List[Tuple[Position, Tuple[str, str, str, float]]], u: OptionFetcher,
+                     fundamentals: Dict[str, Dict[str, Any]]) -> int:
+        """Fills every row the chain did not enrich from one batched Black-Scholes pass; cross-checks the rest."""
+        if np is None:
+            raise SystemExit("❌ --local-greeks needs numpy (pip install numpy)")
+        need = {p[0] for x, p in jobs if not num(x.UnderlyingPrice)}
+        spot = {}
+        # Rows whose underlying quote chunk failed are left without a spot
+        quotes = u.quotes(need, "quote") if need else {}
+        for sym, q in quotes.items():
+            qq = q.get("quote") or {}
+            spot[sym] = num(first(qq.get("mark"), qq.get("lastPrice"), qq.get("closePrice")))
+
+        sel, cols = [], []
+        for x, (u_, e, cp, k) in jobs:
+            S, qty, mv = num(x.UnderlyingPrice) or spot.get(u_), num(x.netQuantity), num(x.marketValue)
+            if not S or not qty or mv is None:
+                continue
+            dte = (date.fromisoformat(e) - date.today()).days
+            dy = num((fundamentals.get(u_) or {}).get("divYield")) or 0
+            sel.append((x, u_, S, dte))
+            cols.append((S, k, max(dte, 1) / 365, dy / 100, abs(mv / (qty * (num(x.deliverableUnits) or 100))), cp == "C"))
+        if not sel:
+            return 0
+
+        g = greeks(*zip(*cols))
+        filled, diffs = 0, []
+        for i, (x, u_, S, dte) in enumerate(sel):
+            if np.isnan(g["volatility"][i]):
+                continue
+            if x.GreeksSource == "chain":
+                if (d := num(x.delta)) is not None:
+                    diffs.append(abs(d - g["delta"][i]))
+                continue
+            for h in ("delta", "theta", "gamma", "vega", "volatility"):
+                setattr(x, h, round(float(g[h][i]), 4))
+            [setattr(x, k2, v) for k2, v in OptionFetcher.fund(fundamentals.get(u_)).items()]
+            x.UnderlyingPrice, x.DTE, x.GreeksSource = S, dte, "local"
+            filled += 1
+        xc = f", chain cross-check median |Δdelta| {float(np.median(diffs)):.3f} over {len(diffs)}" if diffs else ""
+        print(f"🧮 Local greeks: {filled} rows filled{xc}")
+        return filled
+
+    def exposure(self, rows: List[Position]) -> Dict[str, List[Any]]:
+        """
+        Net delta (shares), theta ($/day) and notional per (account, underlying) plus an "ALL" roll-up,
+        via one np.unique/bincount group-by. Options weigh by delta × deliverableUnits; stock is delta 1.
+        """
+        if np is None:
+            print("⚠️ Exposure skipped: needs numpy (pip install numpy)")
+            return {}
+        keys, q, d, th, units, px = [], [], [], [], [], []
+        for x in rows:
+            if x.assetType == "CASH_EQUIVALENT" or not (qty := num(x.netQuantity)):
                 continue
-            u_, e, cp, k = p
-            print(f"[{i:>3}/{len(rows)}] {u_:<8} {e} {cp} {k:<7.2f} ⏱ {time.time()-start:6.1f}s ... ", end="", flush=True)
-            d = u.extract(u.chain(u_, e, cp, k), cp, e, k, fundamentals.get(u_))
-            if d:
-                [ws.cell(r, hdr[k2], v) for k2, v in d.items() if k2 in hdr]
-                ok += 1
-                print(f"{GREEN}✅ updated{RESET}")
+            if x.assetType == "OPTION":
+                if not (p := parse(x.symbol)):
+                    continue
+                und, dl, t, du, S = aliases(p[0])[0], num(x.delta), num(x.theta) or 0, num(x.deliverableUnits) or 100, num(x.UnderlyingPrice)
             else:
-                fail.append(s)
-                print(f"{RED}❌ failed{RESET}")
+                und, dl, t, du, S = aliases(str(x.symbol))[0], 1.0, 0, 1, (num(x.marketValue) or 0) / qty
+            keys.append((str(x.accountId), und))
+            q.append(qty); d.append(np.nan if dl is None else dl); th.append(t); units.append(du); px.append(S or np.nan)
+        if not keys:
+            return {}
+
+        q, d, th, units, px = (np.asarray(a, dtype=float) for a in (q, d, th, units, px))
+        shares = q * np.nan_to_num(d) * units
+        cols: Dict[str, List[Any]] = {h: [] for h in EXPO_HDRS}
+        for acct_of in (lambda k: k[0], lambda k: "ALL"):
+            uniq, inv = np.unique(np.array([f"{acct_of(k)}\x1f{k[1]}" for k in keys]), return_inverse=True)
+            n = len(uniq)
+            agg = {
+                "positions": np.bincount(inv, minlength=n),
+                "netDeltaShares": np.bincount(inv, shares, n),
+                "netTheta": np.bincount(inv, q * th * units, n),
+                "deltaNotional": np.bincount(inv, np.nan_to_num(shares * px), n),
+                "grossNotional": np.bincount(inv, np.nan_to_num(np.abs(q) * units * px), n),
+                # mean of the prices seen in the group (chain underlying for options, own mark for stock)
+                "UnderlyingPrice": np.bincount(inv[~np.isnan(px)], px[~np.isnan(px)], n)
+                                   / np.maximum(np.bincount(inv[~np.isnan(px)], minlength=n), 1),
+            }
+            for i, key in enumerate(uniq):
+                acct, und = str(key).split("\x1f")
+                cols["accountId"].append(acct)
+                cols["underlying"].append(und)
+                for h, v in agg.items():
+                    cols[h].append(int(v[i]) if h == "positions" else round(float(v[i]), 4))
+        print(f"📐 Exposure: {len(cols['underlying'])} account/underlying rows")
+        return cols
+
+    def save(self, rows: List[Position], expo: Optional[Dict[str, List[Any]]] = None):
+        # write-only mode streams rows straight to the zip, so memory stays flat
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Positions")
+        ws.append(self.HDRS)
+        for x in rows:
+            ws.append(x.row())
+        if expo:
+            ws = wb.create_sheet("Exposure")
+            ws.append(EXPO_HDRS)
+            for r in zip(*(expo[h] for h in EXPO_HDRS)):
+                ws.append(list(r))
         wb.save(CONFIG["XLSX_FILE"])
-        print(f"\n📊 Done: {GREEN}{ok} updated{RESET}, {RED}{len(fail)} failed{RESET}")
-        print(f"⏳ Total elapsed: {time.time()-start:.1f}s")
+        print(f"💾 Saved {len(rows)} rows → {CONFIG['XLSX_FILE']}")
+
+    def save_parquet(self, rows: List[Position], expo: Optional[Dict[str, List[Any]]] = None,
+                     root: Optional[Path] = None, ts: Optional[float] = None):
+        """
+        Appends this run to hive-partitioned datasets under <root>/positions and <root>/exposure,
+        laid out as date=YYYY-MM-DD/accountId=…/<epoch ms>-N.parquet. accountId is the string account
+        number (or "ALL" for exposure roll-ups); read it back with a string partitioning, e.g.
+        ds.partitioning(pa.schema([("date", pa.string()), ("accountId", pa.string())]), flavor="hive"),
+        so leading zeros survive.
+        """
+        if pa is None:
+            raise SystemExit("❌ --parquet needs pyarrow (pip install pyarrow)")
+        root, ts = root or CONFIG["PARQUET_DIR"], ts or time.time()
+
+        def append(path: Path, cols: Dict[str, List[Any]], hdrs: List[str]):
+            n = len(cols[hdrs[0]])
+            schema = pa.schema([pa.field(h, pa.string() if h in TEXT else pa.float64()) for h in hdrs] + [
+                pa.field("snapshotTs", pa.timestamp("s", tz="UTC")), pa.field("date", pa.string())])
+            cols = {h: [(None if v is None else str(v)) if h in TEXT else num(v) for v in cols[h]] for h in hdrs}
+            cols["snapshotTs"] = [int(ts)] * n
+            cols["date"] = [time.strftime("%Y-%m-%d", time.localtime(ts))] * n
+            pq.write_to_dataset(pa.Table.from_pydict(cols, schema=schema), str(path),
+                                partition_cols=["date", "accountId"],
+                                basename_template=f"{int(ts * 1000)}-{{i}}.parquet")
+
+        append(root / "positions", {h: [getattr(x, h) for x in rows] for h in HDRS}, HDRS)
+        if expo:
+            append(root / "exposure", expo, EXPO_HDRS)
+        print(f"🗃️ Appended {len(rows)} rows → {root}")
 
 # --------------------------------------------------------------------------
 # Entry
 # --------------------------------------------------------------------------
-def main():
-    t = SchwabAuth().refresh()
-    r = requests.get(CONFIG["ACCT_URL"], headers={"Authorization": f"Bearer {t}"}, params={"fields": "positions"})
+def get_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Schwab positions exporter")
+    ap.add_argument("--profiles", nargs="+", type=Path, default=[], metavar="ENV",
+                    help="Credential .env files to export together (each may set SCHWAB_TOKEN_PATH); "
+                         "default is the process .env")
+    ap.add_argument("--workers", type=int, default=CONFIG["WORKERS"],
+                    help="Concurrent option-chain requests in phase2 (1 = sequential)")
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the market-data cache entirely")
+    ap.add_argument("--refresh", action="store_true", help="Ignore cached market data but store fresh responses")
+    ap.add_argument("--full", action="store_true",
+                    help="Re-enrich every position instead of carrying forward unchanged ones")
+    ap.add_argument("--local-greeks", action="store_true",
+                    help="Skip option-chain requests and compute greeks/IV locally (needs numpy)")
+    ap.add_argument("--parquet", nargs="?", type=Path, const=CONFIG["PARQUET_DIR"], default=None, metavar="DIR",
+                    help="Also append this run to the Parquet position history (default dir from CONFIG)")
+    ap.add_argument("--prom", type=Path, default=None, metavar="FILE",
+                    help="Also write run metrics as a Prometheus textfile (node_exporter textfile collector)")
+    ap.add_argument("--from-snapshot", nargs="?", const="latest", default=None, metavar="FILE",
+                    help="Replay accounts from a stored raw snapshot (default: latest) instead of the trader API")
+    ap.add_argument("--carry-secs", type=float, default=None, metavar="SECS",
+                    help="Max age of carried greeks/prices for unchanged positions (default: chain cache TTL, "
+                         "capped at the --watch interval; 0 re-fetches them every run)")
+    ap.add_argument("--watch", type=float, nargs="?", const=60.0, default=None, metavar="SECS",
+                    help="Keep running, re-exporting every SECS (default 60) and writing only on change")
+    return ap.parse_args()
+
+def profile_name(p: Path) -> str:
+    """acct1/.env → acct1, creds/work.env → creds-work: unique per login even when every file is `.env`."""
+    p = Path(p).resolve()
+    stem = p.name[:-len(".env")] if p.name.endswith(".env") else p.stem
+    return "-".join(x for x in (p.parent.name, stem.strip(".")) if x) or "default"
+
+def fetch_accounts(c: Client, auth: SchwabAuth) -> List[Dict[str, Any]]:
+    r = c.get(CONFIG["ACCT_URL"], params={"fields": "positions"}, headers=auth.header())
     r.raise_for_status()
     d = r.json()
-    Path(CONFIG["RAW_FILE"]).write_text(json.dumps(d, indent=2))
+    return d if isinstance(d, list) else [d] if "securitiesAccount" in d else d.get("accounts", [])
+
+def run_once(args: argparse.Namespace, c: Client, cache: Optional[Cache], auths: List[SchwabAuth], last: str = "") -> str:
+    """One export pass; outputs are rewritten only when the enriched rows differ from `last` (a digest)."""
+    with METRICS.span("accounts"):
+        if args.from_snapshot:
+            d = load_snapshot(args.from_snapshot)
+            print(f"📼 Replaying accounts from snapshot {args.from_snapshot}")
+        else:
+            # every login's accounts in parallel; an account visible to two logins is kept once
+            with ThreadPoolExecutor(max_workers=len(auths)) as pool:
+                per = list(pool.map(lambda au: fetch_accounts(c, au), auths))
+            seen: Dict[str, Dict[str, Any]] = {}
+            for x in (x for accts in per for x in accts):
+                seen.setdefault(str((x.get("securitiesAccount") or {}).get("accountNumber", len(seen))), x)
+            d = list(seen.values())
+            if len(auths) > 1:
+                print(f"👥 {len(auths)} profiles → {len(d)} accounts")
+            save_snapshot(d)
     a = d if isinstance(d, list) else [d] if "securitiesAccount" in d else d.get("accounts", [])
     if not a:
-        return print("⚠️ No accounts found")
+        print("⚠️ No accounts found")
+        return last
     e = Exporter()
-    e.phase1(a)
-    e.phase2(t)
+    with METRICS.span("phase1"):
+        rows = e.phase1(a)
+    with METRICS.span("phase2"):
+        e.phase2(rows, c, args.workers, cache, args.local_greeks, None if args.full else e.load_state())
+        e.save_state(rows)
+    with METRICS.span("exposure"):
+        expo = e.exposure(rows)
+    digest = hashlib.sha1(json.dumps([[x.row() for x in rows], expo], default=str).encode()).hexdigest()
+    if digest == last:
+        print("💤 No changes since last export")
+        return last
+    with METRICS.span("excel"):
+        e.save(rows, expo)
+    if args.parquet:
+        with METRICS.span("parquet"):
+            e.save_parquet(rows, expo, args.parquet)
+    return digest
+
+def main():
+    args = get_args()
+    # market fields must not outlive the chain cache or a watch tick, or fresh marketValue sits next to stale greeks
+    CONFIG["CARRY_SECS"] = args.carry_secs if args.carry_secs is not None else min(
+        CONFIG["CARRY_SECS"], CONFIG["CACHE_TTL"]["chains"], args.watch or float("inf"))
+    c = Client(args.workers)
+    profiles = [(profile_name(p), dotenv_values(p)) for p in args.profiles] or [("default", dict(os.environ))]
+    dup = [n for n, k in Counter(n for n, _ in profiles).items() if k > 1]
+    if dup:
+        raise SystemExit(f"❌ Profiles resolve to the same name ({', '.join(dup)}); each login needs its own .env")
+    auths = [SchwabAuth(c, env, name, primary=i == 0) for i, (name, env) in enumerate(profiles)]
+    if len({au.token_path.resolve() for au in auths}) < len(auths):
+        raise SystemExit("❌ Two profiles share a token file; give each its own SCHWAB_TOKEN_PATH")
+    with METRICS.span("auth"), ThreadPoolExecutor(max_workers=len(auths)) as pool:
+        list(pool.map(SchwabAuth.token, auths))
+    cache = None if args.no_cache else Cache(CONFIG["CACHE_FILE"], read=not args.refresh)
+    if not args.watch:
+        run_once(args, c, cache, auths)
+    else:
+        # token, pooled session and cache stay warm across ticks; only changed results are written
+        print(f"👀 Watching every {args.watch}s — Ctrl+C to stop")
+        last = ""
+        try:
+            while True:
+                t0 = time.time()
+                METRICS.reset()  # each tick's report covers that tick only, and latencies stay bounded
+                try:
+                    with METRICS.span("auth"):
+                        [au.token() for au in auths]
+                    last = run_once(args, c, cache, auths, last)
+                    METRICS.write(prom=args.prom)
+                except Exception as ex:  # a bad tick (network, share, cache, writer) must not end the watch
+                    print(f"⚠️ Tick failed: {type(ex).__name__}: {ex}")
+                time.sleep(max(0.0, args.watch - (time.time() - t0)))
+        except KeyboardInterrupt:
+            print("\n👋 Watch stopped")
+    n, k = c.stats()
+    print(f"🔌 HTTP: {n} requests over {k} connections ({1 - k / max(n, 1):.0%} reused), {c.retries} retried")
+    if cache:
+        print(f"🗄️ Cache: {cache.hits} hits, {cache.misses} misses")
+    METRICS.write(prom=args.prom)
+    rep = METRICS.report()
+    print("⏱ " + " | ".join(f"{k} {v:.1f}s" for k, v in rep["phases_s"].items()) + f" → {CONFIG['REPORT_FILE']}")
+    for ep, v in rep["endpoints"].items():
+        print(f"   {ep:<10} {v['calls']:>5} calls  p50 {v['p50_ms']:>7.1f}ms  p95 {v['p95_ms']:>7.1f}ms  "
+              f"p99 {v['p99_ms']:>7.1f}ms  {v['bytes'] / 2 ** 20:6.2f} MB  {v['cache_hits']} hits  {v['retries']} retries")
+    [au.close() for au in auths]
 
 if __name__ == "__main__":
     main()